@@ -0,0 +1,167 @@
+import base64
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from requests.cookies import RequestsCookieJar, create_cookie
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to unlocked access
+    fcntl = None
+
+
+def jwt_expiry(token: str) -> float | None:
+    """Return the `exp` claim of a JWT as a unix timestamp, without verifying the signature."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class SessionCache:
+    """
+    On-disk cache of the anny cookie jar and customer account id, and of what
+    outlives that session: the customer profile the checkout form returns and the
+    IdP session cookies, which let the next SSO login skip the password form.
+
+    Entries are keyed by provider and username so several accounts can share one
+    file. Reads and writes are serialized with an advisory lock on a sidecar
+    `.lock` file, so concurrent runs never see a half-written cache.
+    """
+
+    def __init__(self, path: str, min_validity: int = 600):
+        self.path = path
+        # Seconds the JWT must still be valid for, so it does not expire mid-booking
+        self.min_validity = min_validity
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, data: dict):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".anny-cache-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _key(provider: str, username: str) -> str:
+        return f"{provider.lower()}:{username}"
+
+    @staticmethod
+    def _serialize_cookies(cookies: RequestsCookieJar) -> list[dict]:
+        return [{
+            "name": c.name,
+            "value": c.value,
+            "domain": c.domain,
+            "path": c.path,
+            "expires": c.expires,
+            "secure": c.secure,
+        } for c in cookies]
+
+    @staticmethod
+    def _deserialize_cookies(items: list[dict]) -> RequestsCookieJar:
+        jar = RequestsCookieJar()
+        for item in items:
+            jar.set_cookie(create_cookie(**item))
+        return jar
+
+    def _count(self, data: dict, field: str):
+        stats = data.setdefault("stats", {"hits": 0, "misses": 0})
+        stats[field] = stats.get(field, 0) + 1
+
+    def load(self, provider: str, username: str) -> tuple[RequestsCookieJar, str] | None:
+        """
+        Return (cookies, customer_account_id) if a cached session with a JWT that is
+        valid for at least `min_validity` seconds exists, otherwise None.
+        Every call is counted as a hit or miss in the cache file.
+        """
+        with self._locked():
+            data = self._read()
+            entry = data.get("accounts", {}).get(self._key(provider, username))
+
+            result = None
+            if entry:
+                cookies = self._deserialize_cookies(entry.get("cookies", []))
+                token = cookies.get("anny_shop_jwt")
+                expiry = jwt_expiry(token) if token else None
+                if expiry and expiry - time.time() >= self.min_validity:
+                    result = (cookies, entry.get("customer_account_id"))
+
+            self._count(data, "hits" if result else "misses")
+            try:
+                self._write(data)
+            except OSError:
+                pass
+            return result
+
+    def save(self, provider: str, username: str, cookies: RequestsCookieJar, customer_account_id: str | None):
+        with self._locked():
+            data = self._read()
+            data.setdefault("accounts", {})[self._key(provider, username)] = {
+                "cookies": self._serialize_cookies(cookies),
+                "customer_account_id": customer_account_id,
+                "saved_at": time.time(),
+            }
+            self._write(data)
+
+    def load_customer(self, provider: str, username: str) -> dict | None:
+        with self._locked():
+            return self._read().get("customers", {}).get(self._key(provider, username))
+
+    def save_customer(self, provider: str, username: str, customer: dict):
+        with self._locked():
+            data = self._read()
+            data.setdefault("customers", {})[self._key(provider, username)] = customer
+            self._write(data)
+
+    def load_idp_cookies(self, provider: str, username: str) -> RequestsCookieJar | None:
+        with self._locked():
+            entry = self._read().get("idp", {}).get(self._key(provider, username))
+        return self._deserialize_cookies(entry["cookies"]) if entry else None
+
+    def save_idp_cookies(self, provider: str, username: str, cookies: list):
+        with self._locked():
+            data = self._read()
+            data.setdefault("idp", {})[self._key(provider, username)] = {
+                "cookies": self._serialize_cookies(cookies),
+                "saved_at": time.time(),
+            }
+            self._write(data)
+
+    def invalidate(self, provider: str, username: str):
+        with self._locked():
+            data = self._read()
+            if data.get("accounts", {}).pop(self._key(provider, username), None) is not None:
+                self._write(data)
+
+    def stats(self) -> dict:
+        with self._locked():
+            return self._read().get("stats", {"hits": 0, "misses": 0})
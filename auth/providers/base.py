@@ -1,6 +1,9 @@
+import html
 from abc import ABC, abstractmethod
 import requests
 
+from config.settings import Settings
+
 
 class SSOProvider(ABC):
     """Base class for SSO authentication providers."""
@@ -9,13 +12,18 @@ class SSOProvider(ABC):
     name: str = "base"
     domain: str = ""
     available_days_ahead: int = 3
+    release_time: str = "00:00:00"  # Local time at which the next day becomes bookable
+    # IdP cookies kept between logins; while the IdP session is valid it answers with the SAML response right away
+    idp_cookie_names: tuple[str, ...] = ("shib_idp_session",)
 
-    def __init__(self, username: str, password: str):
+    def __init__(self, username: str, password: str, settings: Settings = None):
         self.username = username
         self.password = password
+        self.settings = settings or Settings()
         self.session: requests.Session = None
         self.redirect_response: requests.Response = None
         self.saml_response_html: str = None
+        self.reused_idp_session = False
 
     def set_session(self, session: requests.Session):
         """Set the shared session from AnnySession."""
@@ -24,6 +32,18 @@ class SSOProvider(ABC):
     def set_redirect_response(self, response: requests.Response):
         """Set the redirect response from Anny SSO initiation."""
         self.redirect_response = response
+        self.reused_idp_session = False
+
+    def saml_response(self, response: requests.Response) -> str | None:
+        """
+        The HTML of `response` if it already is the SAML form posting to anny's `/consume`,
+        i.e. the IdP still knew us and skipped the password form.
+        """
+        page = html.unescape(response.text)
+        if "/consume" in page and 'name="SAMLResponse"' in page:
+            self.reused_idp_session = True
+            return response.text
+        return None
 
     @abstractmethod
     def authenticate(self) -> str:
@@ -10,18 +10,27 @@ class KITProvider(SSOProvider):
     domain = "kit.edu"
     available_days_ahead = 3
 
+    @property
+    def idp_url(self) -> str:
+        return self.settings.kit_idp_url
+
     def authenticate(self) -> str:
         self.session.headers.pop('x-requested-with', None)
         self.session.headers.pop('x-inertia', None)
         self.session.headers.pop('x-inertia-version', None)
 
+        # Still logged in at the IdP: the redirect already carries the SAML response
+        saml_html = self.saml_response(self.redirect_response)
+        if saml_html:
+            return saml_html
+
         csrf_token = extract_html_value(
             self.redirect_response.text,
             r'name="csrf_token" value="([^"]+)"'
         )
 
         response = self.session.post(
-            'https://idp.scc.kit.edu/idp/profile/SAML2/Redirect/SSO?execution=e1s1',
+            self.idp_url,
             data={
                 'csrf_token': csrf_token,
                 'j_username': self.username,
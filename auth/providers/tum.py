@@ -15,6 +15,11 @@ class TUMProvider(SSOProvider):
         self.session.headers.pop('x-inertia', None)
         self.session.headers.pop('x-inertia-version', None)
 
+        # Still logged in at the IdP: the redirect already carries the SAML response
+        saml_html = self.saml_response(self.redirect_response)
+        if saml_html:
+            return saml_html
+
         csrf_token = extract_html_value(
             self.redirect_response.text,
             r'name="csrf_token" value="([^"]+)"'
@@ -36,6 +41,11 @@ class TUMProvider(SSOProvider):
             }
         )
 
+        # The IdP session was found during the localStorage probe
+        saml_html = self.saml_response(response)
+        if saml_html:
+            return saml_html
+
         old_referer = self.session.headers.get('referer')
         self.session.headers.update({
             'referer': response.url
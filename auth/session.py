@@ -1,49 +1,157 @@
 import requests
 import urllib.parse
 import re
-from config.constants import AUTH_BASE_URL, ANNY_BASE_URL, DEFAULT_HEADERS
+from config.settings import Settings, DEFAULT_HEADERS
 from utils.helpers import extract_html_value
 from auth.providers import get_provider, SSOProvider
+from auth.cache import SessionCache
+from utils.http import TimedHTTPAdapter
+from utils.tracing import tracer
+
+# Timeout of every login request; the booking requests set their own
+REQUEST_TIMEOUT_SECONDS = 15
 
 
 class AnnySession:
-    def __init__(self, username: str, password: str, provider_name: str):
+    def __init__(self, settings: Settings, cache: SessionCache = None):
         self.session = requests.Session()
-        self.username = username
-        self.password = password
+        # Pooled for the BookingClient taking over the session, with one connection per availability worker
+        self.adapter = TimedHTTPAdapter(pool_maxsize=max(settings.availability_workers, 10),
+                                        timeout=REQUEST_TIMEOUT_SECONDS)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.settings = settings
+        self.username = settings.username
+        self.password = settings.password
+        self.cache = cache
+        self.customer_account_id = None
+        self.from_cache = False
 
         # Initialize the SSO provider
-        provider_class = get_provider(provider_name)
-        self.provider: SSOProvider = provider_class(username, password)
-
-    def login(self):
-        try:
-            self._init_headers()
-            self._sso_login()
-            self._provider_auth()
-            self._consume_saml()
-            print(f"✅ Login successful via {self.provider.name}.")
-            return self.session.cookies
-        except requests.RequestException as e:
-            print(f"❌ Login failed: network error ({type(e).__name__})")
+        provider_class = get_provider(settings.sso_provider)
+        self.provider: SSOProvider = provider_class(settings.username, settings.password, settings)
+
+    def login(self, use_cache: bool = True):
+        """
+        Log in to anny. A cached session is reused while its JWT is valid; pass
+        use_cache=False to force a full SSO login (e.g. after the cached token was rejected).
+        """
+        with tracer.span("login", provider=self.provider.name, account=self.username) as span:
+            if self.cache and use_cache and self._restore_cached():
+                span.set(cached=True)
+                print(f"♻️ Reusing cached {self.provider.name} session.")
+                return self.session.cookies
+
+            try:
+                self.from_cache = False
+                self._init_headers()
+                self._restore_idp_session()
+                with tracer.span("sso_start"):
+                    self._sso_login()
+                with tracer.span("idp_auth") as idp_span:
+                    self._provider_auth()
+                    idp_span.set(reused_idp_session=self.provider.reused_idp_session)
+                with tracer.span("saml_consume"):
+                    self._consume_saml()
+                if self.provider.reused_idp_session:
+                    print(f"✅ Login successful via {self.provider.name} (IdP session reused).")
+                else:
+                    print(f"✅ Login successful via {self.provider.name}.")
+                self._store_cached()
+                self._store_idp_session()
+                return self.session.cookies
+            except requests.RequestException as e:
+                span.fail(type(e).__name__)
+                print(f"❌ Login failed: network error ({type(e).__name__})")
+                return None
+            except ValueError as e:
+                span.fail(str(e))
+                print(f"❌ Login failed: {e}")
+                return None
+            except KeyError as e:
+                span.fail(f"missing field {e}")
+                print(f"❌ Login failed: missing expected field {e}")
+                return None
+
+    def invalidate_cache(self):
+        if self.cache:
+            self.cache.invalidate(self.provider.name, self.username)
+
+    def cached_customer(self) -> dict | None:
+        """The checkout customer profile an earlier run saved for this account, if any."""
+        if not self.cache:
             return None
-        except ValueError as e:
-            print(f"❌ Login failed: {e}")
-            return None
-        except KeyError as e:
-            print(f"❌ Login failed: missing expected field {e}")
+        try:
+            return self.cache.load_customer(self.provider.name, self.username)
+        except OSError as e:
+            print(f"⚠️ Could not read session cache: {e}")
             return None
 
+    def store_customer(self, customer: dict):
+        if not self.cache:
+            return
+        try:
+            self.cache.save_customer(self.provider.name, self.username, customer)
+        except OSError as e:
+            print(f"⚠️ Could not write session cache: {e}")
+
+    def _restore_cached(self) -> bool:
+        try:
+            cached = self.cache.load(self.provider.name, self.username)
+        except OSError as e:
+            print(f"⚠️ Could not read session cache: {e}")
+            return False
+        if not cached:
+            return False
+
+        cookies, self.customer_account_id = cached
+        self.session.cookies.update(cookies)
+        self.from_cache = True
+        return True
+
+    def _store_cached(self):
+        if not self.cache:
+            return
+        try:
+            self.cache.save(self.provider.name, self.username, self.session.cookies, self.customer_account_id)
+        except OSError as e:
+            print(f"⚠️ Could not write session cache: {e}")
+
+    def _restore_idp_session(self):
+        """Put the IdP cookies of an earlier login back into the jar, so the IdP may skip the password form."""
+        if not self.cache:
+            return
+        try:
+            cookies = self.cache.load_idp_cookies(self.provider.name, self.username)
+        except OSError as e:
+            print(f"⚠️ Could not read session cache: {e}")
+            return
+        if cookies:
+            self.session.cookies.update(cookies)
+
+    def _store_idp_session(self):
+        if not self.cache:
+            return
+        cookies = [c for c in self.session.cookies if c.name in self.provider.idp_cookie_names]
+        if not cookies:
+            return
+        try:
+            self.cache.save_idp_cookies(self.provider.name, self.username, cookies)
+        except OSError as e:
+            print(f"⚠️ Could not write session cache: {e}")
+
     def _init_headers(self):
+        # Start over: a BookingClient may have taken over the session and set the API headers
+        self.session.headers = requests.utils.default_headers()
         self.session.headers.update({
             **DEFAULT_HEADERS,
             'accept': 'text/html, application/xhtml+xml',
-            'referer': AUTH_BASE_URL + '/',
-            'origin': AUTH_BASE_URL
+            'referer': self.settings.auth_base_url + '/',
+            'origin': self.settings.auth_base_url
         })
 
     def _sso_login(self):
-        r1 = self.session.get(f"{AUTH_BASE_URL}/login/sso")
+        r1 = self.session.get(f"{self.settings.auth_base_url}/login/sso")
         self.session.headers['X-XSRF-TOKEN'] = urllib.parse.unquote(r1.cookies['XSRF-TOKEN'])
 
         page_data = extract_html_value(r1.text, r'data-page="(.*?)"')
@@ -56,7 +164,7 @@ class AnnySession:
             'x-inertia-version': x_inertia_version
         })
 
-        r2 = self.session.post(f"{AUTH_BASE_URL}/login/sso", json={"domain": self.provider.domain})
+        r2 = self.session.post(f"{self.settings.auth_base_url}/login/sso", json={"domain": self.provider.domain})
         redirect_url = r2.headers['x-inertia-location']
         redirect_response = self.session.get(redirect_url)
 
@@ -78,7 +186,7 @@ class AnnySession:
             'SAMLResponse': saml_response
         })
 
-        home = self.session.get(f"{ANNY_BASE_URL}/en-us/login?target=/en-us/home?withoutIntent=true")
+        home = self.session.get(f"{self.settings.anny_base_url}/en-us/login?target=/en-us/home?withoutIntent=true")
 
         self.customer_account_id = (
             self._extract_customer_account_id(callback.text) or
@@ -0,0 +1,133 @@
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+
+from dotenv import load_dotenv
+
+from auth.cache import SessionCache
+from booking.claims import ClaimStore, DeskClaims, open_store
+from booking.history import RunHistory
+from booking.resource_index import ResourceIndex
+from booking.runner import BookingRun, next_release, calibrate_deadline, report_fire_error, write_trace
+from utils.output import prefix_output, as_account
+from utils.scheduler import wait_until
+from config.settings import Settings, ProcessSettings, ConfigError, load_settings, load_process_settings
+
+# Settings that belong to one library and account, so roster entries don't take them from .env
+ACCOUNT_DEFAULTS = {"resource_ids": [], "use_any_resource_id": False, "resource_url_path": None, "service_id": None,
+                    "resource_groups": [], "use_all_resource_groups": False}
+
+
+def load_roster(path, settings: Settings, cache, index, claims_store: ClaimStore = None,
+                run_history: RunHistory = None):
+    """
+    Read a JSON list of accounts. Every entry needs "username" and either "password"
+    or "password_env" (name of an environment variable holding the password).
+    "provider" selects the SSO provider; any other key is the name of a setting
+    ("booking_times", "resource_ids", ...). The resource settings ("resource_ids",
+    "use_any_resource_id", "resource_url_path", "service_id", "resource_groups",
+    "use_all_resource_groups") are per account, all other settings default to
+    `settings` (from .env). With a `claims_store`, every account is a booker of its own.
+    A `run_history` seeds the desk ranking of every account.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+
+    runs = []
+    for i, entry in enumerate(entries):
+        password = entry.get("password") or getenv(entry.get("password_env") or "")
+        if not entry.get("username") or not password:
+            print(f"❌ Roster entry {i + 1} is missing a username or password, skipping...")
+            continue
+
+        values = {k: v for k, v in entry.items() if k not in ("password_env", "provider")}
+        values.update(password=password, sso_provider=entry.get("provider"))
+        try:
+            account = Settings.from_dict(values, base=settings.replace(**ACCOUNT_DEFAULTS))
+        except ConfigError as e:
+            print(f"❌ Roster entry {i + 1} is invalid, skipping: {e}")
+            continue
+        claims = DeskClaims.for_account(claims_store, account) if claims_store else None
+        runs.append(BookingRun(account, cache=cache, index=index, claims=claims, run_history=run_history))
+    return runs
+
+
+def arm_all(runs, process: ProcessSettings, arm=BookingRun.arm):
+    """Arm all accounts ahead of time, a few logins at a time. Returns the runs that are ready."""
+    with ThreadPoolExecutor(max_workers=process.batch_login_workers) as pool:
+        armed = [run for run, ok in zip(runs, pool.map(lambda run: as_account(run.username, arm, run), runs)) if ok]
+
+    for run in runs:
+        if run not in armed:
+            print(f"❌ {run.username}: login or discovery failed")
+    return armed
+
+
+def fire_all(armed, release, deadline, process: ProcessSettings, trigger="batch"):
+    """
+    Plan every armed run for `release`, wait for `deadline` (monotonic, None to fire
+    immediately) while keeping all connections warm, then book for all accounts at once.
+    `trigger` is recorded in the run history. Returns the results of every run.
+    """
+    with ThreadPoolExecutor(max_workers=min(process.batch_fire_workers, len(armed))) as pool:
+        # Each plan fetches the account's bookings; one slow account must not hold up the others
+        list(pool.map(lambda run: as_account(run.username, run.plan, release), armed))
+
+        if deadline:
+            def keep_alive():
+                list(pool.map(lambda run: run.booking.keep_alive(), armed))
+
+            deadline = calibrate_deadline(armed[0].booking, deadline, process)
+            print(f"⏳ {len(armed)} accounts armed, waiting {deadline - time.monotonic():.0f} seconds until the release...")
+            wait_until(deadline, keep_alive=keep_alive)
+
+        for run in armed:
+            run.booking.adapter.reset_timing()
+        results = list(pool.map(lambda run: as_account(run.username, run.fire), armed))
+
+    if deadline:
+        report_fire_error(armed[0].booking, deadline, process)
+    write_trace(process, release, trigger)
+
+    print("📋 Results:")
+    for run, result in zip(armed, results):
+        for slot, resource_id in result.items():
+            status = f"✅ resource {resource_id}" if resource_id else "❌ not booked"
+            print(f"  {run.username} {slot}: {status}")
+    return results
+
+
+def main(roster_path):
+    # Get variables from dotenv file, which may also hold the passwords of roster entries (password_env)
+    load_dotenv('.env', override=True)
+    settings, process = load_settings(), load_process_settings()
+    if not settings or not process:
+        return False
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    index = ResourceIndex(process.resource_index_path, process.resource_index_ttl) if process.use_resource_index else None
+    # The accounts log in and book in parallel; start each line with the account it belongs to
+    prefix_output()
+
+    runs = load_roster(roster_path, settings, cache, index,
+                       claims_store=open_store(process),
+                       run_history=RunHistory(process.run_history_path) if process.use_run_history else None)
+    if not runs:
+        print("❌ No accounts in roster")
+        return False
+
+    armed = arm_all(runs, process)
+    if not armed:
+        return False
+
+    release, deadline = next_release(settings.tz)
+    results = fire_all(armed, release, deadline, process)
+    return any(any(result.values()) for result in results)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python batch.py <roster.json>")
+        sys.exit(2)
+    main(sys.argv[1])
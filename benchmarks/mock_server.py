@@ -0,0 +1,415 @@
+"""
+Local stand-in for auth.anny.eu, the KIT/TUM Shibboleth IdPs and b.anny.eu.
+
+Serves everything from one port, so the whole login and booking flow can run
+offline with configurable latency, contention and error injection:
+
+    python -m benchmarks.mock_server --port 8080 --latency-ms 30 --contention 0.2
+
+Point the script at it with
+    ANNY_AUTH_BASE_URL=http://127.0.0.1:8080
+    ANNY_BASE_URL=http://127.0.0.1:8080
+    ANNY_BOOKING_API_BASE=http://127.0.0.1:8080/api/v1
+    ANNY_CHECKOUT_FORM_API=http://127.0.0.1:8080/api/ui/checkout-form
+    KIT_IDP_URL=http://127.0.0.1:8080/idp/kit/sso?execution=e1s1
+"""
+import argparse
+import base64
+import hashlib
+import html
+import json
+import random
+import re
+import secrets
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+INERTIA_VERSION = "0123456789abcdef0123456789abcdef"
+RESOURCE_SLUG = "reading-room"
+SERVICE_ID = "449"
+CUSTOMER = {"given_name": "Erika", "family_name": "Mustermann", "email": "erika@example.com"}
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0        # added to every response
+    jitter_ms: float = 0.0         # +/- uniform jitter on top of latency_ms
+    error_rate: float = 0.0        # share of booking API requests answered with 503
+    contention: float = 0.0        # chance a desk is taken by someone else when we try to order it
+    desks: int = 40                # number of desks per reading room
+    rooms: int = 1                 # number of reading rooms, each with its own service
+    quota: int = 1                 # bookings per account and day
+    wrong_password: str = "wrong"  # this password fails the IdP login
+
+
+@dataclass
+class MockState:
+    tokens: dict = field(default_factory=dict)          # jwt -> customer account id
+    booked: dict = field(default_factory=dict)          # (desk id, start) -> owner
+    ends: dict = field(default_factory=dict)            # (desk id, start) -> end of our bookings
+    orders: dict = field(default_factory=dict)          # oid -> order
+    idp_sessions: dict = field(default_factory=dict)    # shib_idp_session cookie -> username
+    requests: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def reset(self):
+        with self.lock:
+            self.booked.clear()
+            self.ends.clear()
+            self.orders.clear()
+            self.requests = 0
+
+
+def make_jwt(lifetime=3600):
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip("=")
+    return f"{encode({'alg': 'none'})}.{encode({'exp': int(time.time()) + lifetime, 'jti': secrets.token_hex(8)})}.sig"
+
+
+def room_slug(room):
+    return RESOURCE_SLUG if room == 0 else f"{RESOURCE_SLUG}-{room + 1}"
+
+
+def room_service(room):
+    return str(int(SERVICE_ID) + room)
+
+
+def desk_ids(config, room=None):
+    """Desk ids of one room (room 0: 5000, 5001, ...; room 1: 6000, ...), or of all rooms."""
+    rooms = range(config.rooms) if room is None else [room]
+    return [str(5000 + r * 1000 + i) for r in rooms for i in range(config.desks)]
+
+
+def desk_room(desk_id):
+    return (int(desk_id) - 5000) // 1000
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately - without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+    config: MockConfig = None
+    state: MockState = None
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def base_url(self):
+        return f"http://{self.headers.get('host')}"
+
+    # --- plumbing -----------------------------------------------------------
+
+    def _delay(self):
+        delay = self.config.latency_ms + random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _body(self):
+        return self.body
+
+    def _form(self):
+        return {k: v[0] for k, v in parse_qs(self._body().decode(), keep_blank_values=True).items()}
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _html(self, body, headers=None):
+        self._send(200, body, "text/html; charset=utf-8", headers)
+
+    def _error(self, status, title, detail):
+        self._send(status, {"errors": [{"title": title, "detail": detail}]})
+
+    def _dispatch(self):
+        with self.state.lock:
+            self.state.requests += 1
+        self._delay()
+
+        # Always consume the body, so early error responses don't break keep-alive connections
+        length = int(self.headers.get('content-length') or 0)
+        self.body = self.rfile.read(length) if length else b""
+
+        url = urlparse(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        route = f"{self.command} {url.path}"
+
+        if self.command == "HEAD":
+            return self._send(200)
+
+        if url.path.startswith("/api/"):
+            if self.config.error_rate and random.random() < self.config.error_rate:
+                return self._error(503, "Service Unavailable", "Injected error")
+            if not self._authorized():
+                return self._error(401, "Unauthenticated", "Invalid token")
+
+        for pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, route)
+            if match:
+                return handler(self, *match.groups())
+        self._error(404, "Not Found", route)
+
+    do_GET = do_POST = do_HEAD = _dispatch
+
+    def _authorized(self):
+        token = (self.headers.get('authorization') or "").removeprefix("Bearer ")
+        return token in self.state.tokens
+
+    def _account(self):
+        token = (self.headers.get('authorization') or "").removeprefix("Bearer ")
+        return self.state.tokens.get(token)
+
+    # --- auth.anny.eu -------------------------------------------------------
+
+    def sso_page(self):
+        page = html.escape(json.dumps({"component": "Auth/Sso", "version": INERTIA_VERSION}))
+        self._html(f'<div id="app" data-page="{page}"></div>', {
+            'set-cookie': f"XSRF-TOKEN={secrets.token_urlsafe(16)}; Path=/"
+        })
+
+    def sso_start(self):
+        domain = json.loads(self._body() or b"{}").get("domain", "")
+        provider = "tum" if domain == "tum.de" else "kit"
+        self._send(409, b"", headers={'x-inertia-location': f"{self.base_url}/idp/{provider}/sso"})
+
+    # --- Shibboleth IdP -----------------------------------------------------
+
+    def _idp_user(self):
+        match = re.search(r'shib_idp_session=([^;\s]+)', self.headers.get('cookie') or "")
+        return self.state.idp_sessions.get(match.group(1)) if match else None
+
+    def _saml_form(self, username, headers=None):
+        saml = base64.b64encode(f"<saml>{username}</saml>".encode()).decode()
+        self._html(
+            f'<form action="{self.base_url}/saml/consume" method="post">'
+            f'<input type="hidden" name="RelayState" value="ss:mem:{secrets.token_hex(8)}"/>'
+            f'<input type="hidden" name="SAMLResponse" value="{saml}"/></form>',
+            headers
+        )
+
+    def idp_page(self, provider):
+        # KIT answers a known IdP session right away, TUM only after the localStorage probe
+        if provider == "kit" and self._idp_user():
+            return self._saml_form(self._idp_user())
+        self._html(f'<form method="post"><input type="hidden" name="csrf_token" value="{secrets.token_hex(8)}"/></form>')
+
+    def idp_post(self, provider):
+        form = self._form()
+        if "j_username" not in form:
+            if self._idp_user():
+                return self._saml_form(self._idp_user())
+            # TUM's localStorage probe - answer with the credentials form
+            return self._html(f'<form method="post"><input type="hidden" name="csrf_token" value="{secrets.token_hex(8)}"/></form>')
+
+        if not form.get("j_username") or form.get("j_password") in ("", self.config.wrong_password):
+            return self._html('<p class="form-error">The password you entered was incorrect.</p>')
+
+        idp_session = secrets.token_urlsafe(16)
+        with self.state.lock:
+            self.state.idp_sessions[idp_session] = form["j_username"]
+        self._saml_form(form["j_username"], {'set-cookie': f"shib_idp_session={idp_session}; Path=/idp"})
+
+    def saml_consume(self):
+        form = self._form()
+        username = base64.b64decode(form.get("SAMLResponse", "")).decode(errors="ignore")
+        account = str(uuid.uuid5(uuid.NAMESPACE_URL, username))
+        token = make_jwt()
+        with self.state.lock:
+            self.state.tokens[token] = account
+        self._html(f'<script>window.data = ["customer-accounts","{account}"]</script>', {
+            'set-cookie': f"anny_shop_jwt={token}; Path=/"
+        })
+
+    def home(self):
+        self._html("<html><body>Home</body></html>")
+
+    # --- b.anny.eu ----------------------------------------------------------
+
+    def all_resources(self, account):
+        rooms = range(self.config.rooms)
+        self._send(200, {
+            "data": [{
+                "id": str(10 + room), "type": "resources",
+                "attributes": {"name": f"Reading Room {room + 1}", "slug": room_slug(room), "has_children": True},
+                "relationships": {"services": {"data": [{"id": room_service(room), "type": "services"}]}},
+            } for room in rooms],
+            "included": [{"id": room_service(room), "type": "services", "attributes": {"name": "Seat"}}
+                         for room in rooms],
+            "meta": {"last_page": 1},
+        })
+
+    def children(self, slug):
+        room = next((r for r in range(self.config.rooms) if room_slug(r) == slug), None)
+        if room is None:
+            return self._error(404, "Not Found", "Unknown resource")
+        start = self.query.get("filter[available_from]")
+        with self.state.lock:
+            held = {o["resource_id"] for o in self.state.orders.values() if o["start"] == start}
+            ids = [d for d in desk_ids(self.config, room)
+                   if not start or ((d, start) not in self.state.booked and d not in held)]
+
+        size = int(self.query.get("page[size]") or 250)
+        page = int(self.query.get("page[number]") or 1)
+        last_page = max((len(ids) + size - 1) // size, 1)
+        body = json.dumps({
+            "data": [{"id": d, "type": "resources", "attributes": {"name": f"Desk {int(d) % 1000 + 1}"}}
+                     for d in ids[(page - 1) * size:page * size]],
+            "meta": {"last_page": last_page},
+        }).encode()
+
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('if-none-match') == etag:
+            return self._send(304, headers={'etag': etag})
+        self._send(200, body, headers={'etag': etag})
+
+    def bookings(self, account):
+        with self.state.lock:
+            mine = [(r_id, start) for (r_id, start), owner in self.state.booked.items() if owner == account]
+            data = [{
+                "id": f"{r_id}-{start}", "type": "bookings",
+                "attributes": {"start_date": start, "end_date": self.state.ends.get((r_id, start)), "status": "confirmed"},
+                "relationships": {"resource": {"data": {"id": r_id, "type": "resources"}}},
+            } for r_id, start in sorted(mine, key=lambda b: b[1])]
+        self._send(200, {"data": data, "meta": {"last_page": 1}})
+
+    def create_order(self):
+        payload = json.loads(self._body() or b"{}")
+        resource_id = payload.get("resource_id", [None])[0]
+        start, end = payload.get("start_date"), payload.get("end_date")
+
+        with self.state.lock:
+            if random.random() < self.config.contention:
+                self.state.booked.setdefault((resource_id, start), "someone else")
+            held = any(o["resource_id"] == resource_id and o["start"] == start for o in self.state.orders.values())
+            service = room_service(desk_room(resource_id)) if resource_id in desk_ids(self.config) else None
+            if service not in payload.get("service_id", {}) or (resource_id, start) in self.state.booked or held:
+                return self._error(422, "Resource unavailable", "The resource is not available in the selected period.")
+
+            oid, oat = str(uuid.uuid4()), secrets.token_hex(16)
+            self.state.orders[oid] = {"oat": oat, "resource_id": resource_id, "start": start, "end": end,
+                                      "account": self._account()}
+
+        self._send(201, {"data": {"id": oid, "type": "orders", "attributes": {"access_token": oat}}})
+
+    def _order(self):
+        order = self.state.orders.get(self.query.get("oid"))
+        return order if order and order["oat"] == self.query.get("oat") else None
+
+    def checkout_form(self):
+        if not self._order():
+            return self._error(404, "Not Found", "Unknown order")
+        self._send(200, {"default": {"customer": CUSTOMER}})
+
+    def finalize(self):
+        payload = json.loads(self._body() or b"{}")
+        with self.state.lock:
+            order = self._order()
+            if not order:
+                return self._error(404, "Not Found", "Unknown order")
+            if payload.get("customer", {}).get("email") != CUSTOMER["email"]:
+                return self._error(422, "Invalid customer", "The customer data is invalid.")
+
+            day = (order["start"] or "")[:10]
+            booked_today = sum(1 for (_, start), owner in self.state.booked.items()
+                               if owner == order["account"] and (start or "")[:10] == day)
+            if booked_today >= self.config.quota:
+                return self._error(422, "Booking limit reached", "You have reached the maximum number of bookings.")
+
+            self.state.booked[(order["resource_id"], order["start"])] = order["account"]
+            self.state.ends[(order["resource_id"], order["start"])] = order["end"]
+            del self.state.orders[self.query["oid"]]
+
+        self._send(200, {"data": {"id": self.query["oid"], "type": "orders", "attributes": {"status": "confirmed"}}})
+
+    def delete_all(self):
+        with self.state.lock:
+            if self._order():
+                del self.state.orders[self.query["oid"]]
+        self._send(200, {"data": {"id": self.query.get("oid"), "type": "orders"}})
+
+
+ROUTES = [
+    (r"GET /login/sso", MockHandler.sso_page),
+    (r"POST /login/sso", MockHandler.sso_start),
+    (r"GET /idp/(kit|tum)/sso", MockHandler.idp_page),
+    (r"POST /idp/(kit|tum)/sso", MockHandler.idp_post),
+    (r"POST /saml/consume", MockHandler.saml_consume),
+    (r"GET /en-us/login", MockHandler.home),
+    (r"GET /api/v1/customer-accounts/([^/]+)/all-resources", MockHandler.all_resources),
+    (r"GET /api/v1/customer-accounts/([^/]+)/bookings", MockHandler.bookings),
+    (r"GET /api/v1/resources/([^/]+)/children", MockHandler.children),
+    (r"POST /api/v1/order/bookings", MockHandler.create_order),
+    (r"GET /api/v1/order/bookings/delete-all", MockHandler.delete_all),
+    (r"POST /api/v1/order", MockHandler.finalize),
+    (r"GET /api/ui/checkout-form", MockHandler.checkout_form),
+]
+
+
+class MockServer:
+    """The mock server running on a background thread. `url` is the base URL of every endpoint."""
+
+    def __init__(self, config: MockConfig = None, port: int = 0):
+        self.config = config or MockConfig()
+        self.state = MockState()
+        handler = type("BoundMockHandler", (MockHandler,), {"config": self.config, "state": self.state})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def env(self) -> dict:
+        """Environment variables that point the script at this server."""
+        return {
+            "ANNY_AUTH_BASE_URL": self.url,
+            "ANNY_BASE_URL": self.url,
+            "ANNY_BOOKING_API_BASE": f"{self.url}/api/v1",
+            "ANNY_CHECKOUT_FORM_API": f"{self.url}/api/ui/checkout-form",
+            "KIT_IDP_URL": f"{self.url}/idp/kit/sso?execution=e1s1",
+        }
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--contention", type=float, default=0)
+    parser.add_argument("--desks", type=int, default=40)
+    parser.add_argument("--rooms", type=int, default=1)
+    args = parser.parse_args()
+
+    server = MockServer(MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        contention=args.contention, desks=args.desks, rooms=args.rooms
+    ), port=args.port)
+    print(f"Mock anny listening on {server.url}")
+    for name, value in server.env().items():
+        print(f"  {name}={value}")
+    server.httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
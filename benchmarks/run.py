@@ -0,0 +1,154 @@
+"""
+End-to-end latency benchmark against the local mock server.
+
+Times AnnySession.login(), BookingClient.find_available_resources() and a full
+booking (availability lookup + reserve until a desk is booked) and reports
+p50/p95 latency and requests per operation:
+
+    python -m benchmarks.run --iterations 20 --latency-ms 25 --contention 0.3
+"""
+import argparse
+import json
+import math
+import statistics
+import sys
+import time
+
+from auth.session import AnnySession
+from benchmarks.mock_server import MockServer, MockConfig
+from booking.client import BookingClient, CheckoutException
+from config.settings import Settings
+
+START = "2030-01-07T14:00:00+01:00"
+END = "2030-01-07T19:00:00+01:00"
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p * len(ordered)) - 1, 0)]
+
+
+def measure(server, operation):
+    """Run `operation()` and return (result, seconds, requests the server received)."""
+    requests_before = server.state.requests
+    started = time.perf_counter()
+    result = operation()
+    return result, time.perf_counter() - started, server.state.requests - requests_before
+
+
+def benchmark_settings(server, provider) -> Settings:
+    """
+    Settings built from the mock's endpoints and the defaults only, never from .env or
+    the environment, so results are reproducible and no request reaches the real services.
+    """
+    settings = Settings.from_dict({**server.env(), "username": "benchmark", "password": "secret",
+                                   "sso_provider": provider})
+    endpoints = (settings.auth_base_url, settings.anny_base_url, settings.booking_api_base,
+                 settings.checkout_form_api, settings.kit_idp_url)
+    if not all(url.startswith(server.url + "/") or url == server.url for url in endpoints):
+        raise RuntimeError("Benchmark settings point outside the mock server")
+    return settings
+
+
+def run(server, provider, iterations):
+    settings = benchmark_settings(server, provider)
+    samples = {"login": [], "availability": [], "booking": []}
+    failures = {name: 0 for name in samples}
+
+    for _ in range(iterations):
+        server.state.reset()
+
+        session = AnnySession(settings)
+        cookies, seconds, requests = measure(server, session.login)
+        if not cookies:
+            failures["login"] += 1
+            continue
+        samples["login"].append((seconds, requests))
+
+        booking = BookingClient(cookies, customer_account_id=session.customer_account_id, settings=settings,
+                                session=session.session)
+        if not booking.discover_resource_config():
+            failures["availability"] += 1
+            continue
+
+        available, seconds, requests = measure(server, lambda: booking.find_available_resources(START, END))
+        if available is None:
+            failures["availability"] += 1
+        else:
+            samples["availability"].append((seconds, requests))
+
+        def book():
+            for resource in booking.find_available_resources(START, END) or []:
+                try:
+                    if booking.reserve(resource["id"], START, END):
+                        return resource["id"]
+                except CheckoutException:
+                    return None
+            return None
+
+        booked, seconds, requests = measure(server, book)
+        if booked:
+            samples["booking"].append((seconds, requests))
+        else:
+            failures["booking"] += 1
+
+    return samples, failures
+
+
+def summarize(samples, failures):
+    report = {}
+    for name, values in samples.items():
+        latencies = [v[0] * 1000 for v in values]
+        report[name] = {
+            "runs": len(values),
+            "failures": failures[name],
+            "p50_ms": round(percentile(latencies, 0.5), 2) if values else None,
+            "p95_ms": round(percentile(latencies, 0.95), 2) if values else None,
+            "requests_mean": round(statistics.mean(v[1] for v in values), 2) if values else None,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'operation':<14}{'runs':>6}{'failed':>8}{'p50':>11}{'p95':>11}{'requests':>10}")
+    for name, row in report.items():
+        if not row["runs"]:
+            print(f"{name:<14}{0:>6}{row['failures']:>8}{'-':>11}{'-':>11}{'-':>10}")
+            continue
+        print(f"{name:<14}{row['runs']:>6}{row['failures']:>8}{row['p50_ms']:>8.1f} ms{row['p95_ms']:>8.1f} ms"
+              f"{row['requests_mean']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--provider", default="kit", choices=("kit", "tum"))
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--contention", type=float, default=0)
+    parser.add_argument("--desks", type=int, default=40)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    server = MockServer(MockConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        contention=args.contention, desks=args.desks
+    )).start()
+
+    try:
+        samples, failures = run(server, args.provider, args.iterations)
+    finally:
+        server.stop()
+
+    report = summarize(samples, failures)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": report}, f, indent=2)
+
+    return all(row["runs"] for row in report.values())
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,275 @@
+ORDER_INCLUDE_FULL = "customer,voucher,bookings.booking_add_ons.add_on.cover_image,bookings.sub_bookings.resource,bookings.sub_bookings.service,bookings.customer,bookings.service.custom_forms.custom_fields,bookings.service.add_ons.cover_image,bookings.service.add_ons.group,bookings.cancellation_policy,bookings.resource.cover_image,bookings.resource.parent,bookings.resource.location,bookings.resource.category,bookings.reminders,bookings.booking_series,bookings.sequenced_bookings.resource,bookings.sequenced_bookings.service,bookings.sequenced_bookings.service.add_ons.cover_image,bookings.sequenced_bookings.service.add_ons.group,bookings.booking_participants,sub_orders.bookings,sub_orders.organization.legal_documents"
+
+# Relationships side-loaded into order responses, by profile. The client only
+# reads data.id and data.attributes.access_token, so "lean" asks for nothing extra.
+# "full" mirrors what the anny web shop requests.
+INCLUDE_PROFILES = {
+    "full": ORDER_INCLUDE_FULL,
+    "lean": "",
+}
+
+# Desks per availability page; later pages are requested concurrently once the first tells how many there are
+AVAILABILITY_PAGE_SIZE = 250
+
+
+def api_headers(token, origin):
+    return {
+        'authorization': f'Bearer {token}',
+        'accept': 'application/vnd.api+json',
+        'content-type': 'application/vnd.api+json',
+        'origin': origin,
+        'referer': origin + '/',
+        'user-agent': 'Mozilla/5.0'
+    }
+
+
+def all_resources_url(api_base, customer_account_id):
+    return f"{api_base}/customer-accounts/{customer_account_id}/all-resources"
+
+
+def discovery_params(page=1):
+    return {
+        'page[number]': page,
+        'page[size]': 50,
+        'sort': 'name',
+        'include': 'services',
+    }
+
+
+def children_params(page=1):
+    return {
+        'page[number]': page,
+        'page[size]': 250,
+        'sort': 'name',
+        'filter[exclude_hidden]': 0,
+    }
+
+
+def bookings_url(api_base, customer_account_id):
+    return f"{api_base}/customer-accounts/{customer_account_id}/bookings"
+
+
+def bookings_params(page=1):
+    return {
+        'page[number]': page,
+        'page[size]': 100,
+        'sort': 'start_date',
+        'filter[upcoming]': 1,
+    }
+
+
+def parse_bookings(bookings):
+    """Return id, resource id, start and end of every booking in a bookings listing that isn't cancelled."""
+    parsed = []
+    for b in bookings:
+        attributes = b.get('attributes', {})
+        if attributes.get('status') in ('cancelled', 'canceled'):
+            continue
+        resource = b.get('relationships', {}).get('resource', {}).get('data') or {}
+        parsed.append({
+            "id": b.get('id'),
+            "resource_id": resource.get('id'),
+            "start": attributes.get('start_date'),
+            "end": attributes.get('end_date'),
+        })
+    return parsed
+
+
+def parse_available_resources(resources, group=0, service_id=None):
+    """
+    Return id, name, description and parent resource id of every resource in an availability
+    response, with the index and service id of the resource group it was looked up in.
+    """
+    parsed = []
+    for r in resources:
+        attributes = r.get('attributes', {})
+        parent = r.get('relationships', {}).get('parent', {}).get('data') or {}
+        parsed.append({
+            "id": r['id'],
+            "name": attributes.get('name'),
+            "description": attributes.get('description'),
+            "parent_id": parent.get('id'),
+            "group": group,
+            "service_id": service_id,
+        })
+    return parsed
+
+
+def last_page(body):
+    """Number of the last page from the pagination meta of a JSON:API list response, or None if it has none."""
+    meta = body.get('meta') or {}
+    last = (
+        meta.get('last_page') or
+        (meta.get('page') or {}).get('last_page') or
+        (meta.get('pagination') or {}).get('total_pages')
+    )
+    return int(last) if last else None
+
+
+def has_next_page(body, page, page_size):
+    """
+    Whether a JSON:API list response has more pages after `page`. Uses the
+    pagination meta or the `next` link if present, otherwise assumes more pages
+    follow as long as full pages are returned.
+    """
+    last = last_page(body)
+    if last:
+        return page < last
+
+    links = body.get('links') or {}
+    if 'next' in links:
+        return bool(links['next'])
+
+    return len(body.get('data', [])) >= page_size
+
+
+def parse_bookable_resources(resources):
+    """
+    Return (resource path, service id) for every parent resource of an all-resources response.
+
+    Only parent resources (has_children=true) are kept — these have individual desks
+    as children and match the /resources/{slug}/children URL pattern.
+    """
+    bookable = []
+    for r in resources:
+        if not r.get('attributes', {}).get('has_children'):
+            continue
+        svc_refs = r.get('relationships', {}).get('services', {}).get('data', [])
+        if not svc_refs:
+            continue
+        slug = r.get('attributes', {}).get('slug') or r['id']
+        bookable.append((f"/resources/{slug}", svc_refs[0]['id']))
+    return bookable
+
+
+def resource_group_urls(api_base, resource_url, service_id, groups):
+    """
+    (availability url, service id) of the configured resource (if both are set) and then
+    of every (resource path, service id) group, in priority order and without duplicates.
+    """
+    urls = [(resource_url, service_id)] if resource_url and service_id else []
+    urls += [(f"{api_base}{path}", group_service_id) for path, group_service_id in groups]
+    return list(dict.fromkeys(urls))
+
+
+def select_bookable_resources(bookable, api_base, use_all=False):
+    """
+    Pick the first discovered resource, or all of them in discovery order if `use_all`.
+    Returns a list of (resource url, service id), or None if there is none.
+    """
+    if not bookable:
+        print("❌ No bookable resources found. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
+        return None
+
+    if use_all:
+        for resource_path, service_id in bookable:
+            print(f"✅ Auto-discovered: {resource_path}/children:{service_id}")
+        return [(f"{api_base}{resource_path}/children", service_id) for resource_path, service_id in bookable]
+
+    if len(bookable) > 1:
+        print("ℹ️ Multiple bookable resources found. Using the first one automatically.")
+        print("   To use a specific one, set these in your .env:")
+        for resource_path, service_id in bookable:
+            print(f"   RESOURCE_URL_PATH={resource_path}/children")
+            print(f"   SERVICE_ID={service_id}")
+            print()
+        print("   To search all of them, set USE_ALL_RESOURCE_GROUPS=True or list them in RESOURCE_GROUPS.")
+
+    resource_path, service_id = bookable[0]
+    print(f"✅ Auto-discovered: RESOURCE_URL_PATH={resource_path}/children, SERVICE_ID={service_id}")
+    return [(f"{api_base}{resource_path}/children", service_id)]
+
+
+def availability_params(start, end, service_id, page=1):
+    return {
+        'page[number]': page,
+        'page[size]': AVAILABILITY_PAGE_SIZE,
+        'filter[available_from]': start,
+        'filter[available_to]': end,
+        'filter[availability_exact_match]': 1,
+        'filter[exclude_hidden]': 0,
+        'filter[exclude_child_resources]': 0,
+        'filter[availability_service_id]': int(service_id),
+        'filter[include_unavailable]': 0,
+        'filter[pre_order_ids]': '',
+        'sort': 'name'
+    }
+
+
+def order_params(oid=None, oat=None, profile="lean"):
+    params = {'stateless': '1'}
+    include = INCLUDE_PROFILES.get(profile, ORDER_INCLUDE_FULL)
+    if include:
+        params['include'] = include
+    if oid and oat:
+        params.update({'oid': oid, 'oat': oat})
+    return params
+
+
+def order_payload(resource_id, service_id, start, end):
+    return {
+        "resource_id": [resource_id],
+        "service_id": {service_id: 1},
+        "start_date": start,
+        "end_date": end,
+        "description": "",
+        "customer_note": "",
+        "add_ons_by_service": {service_id: [[]]},
+        "sub_bookings_by_service": {},
+        "strategy": "multi-resource"
+    }
+
+
+def parse_order(body):
+    """Return (order id, order access token) from an order response, or None if either is missing."""
+    data = body.get("data", {})
+    oid = data.get("id")
+    oat = data.get("attributes", {}).get("access_token")
+    if not oid or not oat:
+        return None
+    return oid, oat
+
+
+# The fields of the checkout form's customer profile that finalize sends back
+CUSTOMER_FIELDS = ("given_name", "family_name", "email")
+
+
+def complete_customer(customer) -> bool:
+    """Whether a customer profile has a name and an email address, so finalize can send it."""
+    return isinstance(customer, dict) and all(
+        isinstance(customer.get(field), str) and customer[field].strip() for field in CUSTOMER_FIELDS)
+
+
+def parse_customer(body):
+    """Return the customer profile (CUSTOMER_FIELDS) from a checkout form response, or None if it is incomplete."""
+    customer = (body.get("default") or {}).get("customer") or {}
+    customer = {field: customer.get(field) for field in CUSTOMER_FIELDS}
+    return customer if complete_customer(customer) else None
+
+
+def finalize_payload(resource_id, oid, oat, customer, shop_url, timezone):
+    return {
+        "customer": {field: customer.get(field) for field in CUSTOMER_FIELDS},
+        "accept_terms": True,
+        "payment_method": "",
+        "success_url": f"{shop_url}/checkout/success?oids={oid}&oats={oat}",
+        "cancel_url": f"{shop_url}/checkout?step=checkout&childResource={resource_id}",
+        "meta": {"timezone": timezone}
+    }
+
+
+def error_title(body):
+    """Return the title of the first JSON:API error in a response body, or None."""
+    try:
+        return body.get("errors", [])[0]["title"]
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return None
+
+
+def error_summary(body):
+    """Return "title: detail" of the first JSON:API error in a response body, or None."""
+    try:
+        error = body.get("errors", [])[0]
+        return f"{error['title']}: {error['detail']}"
+    except (AttributeError, IndexError, KeyError, TypeError):
+        return None
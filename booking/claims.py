@@ -0,0 +1,312 @@
+"""
+Desk claims shared by several bookers (processes, batch accounts or machines) that
+fire at the same release, so they don't all race for the same top desks.
+
+Every booker joins before the release. Candidate desks are partitioned among the
+bookers that joined: each tries the desks assigned to it first and the others
+afterwards. Before trying a desk, a booker claims it for the slot; desks another
+booker has claimed are skipped, since that booker is already trying them.
+
+The leases are kept in a ClaimStore: a SQLite file for bookers on one machine (on a
+local disk, SQLite's locking is not reliable on network file systems), or a claims
+server for bookers on several machines, which keeps them in a SQLite file of its own:
+
+    python -m booking.claims serve --host 0.0.0.0 --port 8766 --token secret [--path claims.db]
+"""
+import argparse
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookers (
+    booker TEXT PRIMARY KEY,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS claims (
+    slot_start TEXT,
+    resource_id TEXT,
+    booker TEXT,
+    expires_at REAL,
+    PRIMARY KEY (slot_start, resource_id)
+);
+"""
+
+# How long a booker stays a participant after the release it joined for
+BOOKER_LEASE_SECONDS = 15 * 60
+# How long a claimed desk is left to the booker that claimed it
+CLAIM_LEASE_SECONDS = 10 * 60
+# How long a racing booker waits for the desks other bookers release after their race, and how often it looks
+RELEASE_WAIT_SECONDS = 1.0
+RELEASE_POLL_SECONDS = 0.05
+# Timeout of a request to a claims server; claims are made at the release, where waiting costs desks
+SERVER_TIMEOUT_SECONDS = 2
+
+
+class ClaimStoreError(Exception):
+    pass
+
+
+class ClaimStore:
+    """Lease store shared by the bookers. Every method raises ClaimStoreError if the store can't be used."""
+
+    def join(self, booker: str, release_at: float):
+        """Add `booker` to the bookers of the release at unix time `release_at`."""
+        raise NotImplementedError
+
+    def bookers(self) -> list[str]:
+        """The bookers taking part right now, sorted."""
+        raise NotImplementedError
+
+    def claim(self, booker: str, slot_start: str, resource_ids: list[str]) -> list[str]:
+        """Claim the desks for the slot at once. Returns the ones `booker` holds now (newly or already)."""
+        raise NotImplementedError
+
+    def release(self, booker: str, slot_start: str, resource_ids: list[str]):
+        """Give back desks `booker` claimed for the slot."""
+        raise NotImplementedError
+
+
+class SqliteClaimStore(ClaimStore):
+    """
+    Leases in a SQLite file on a local disk. Keeps one connection, which creates
+    the tables when it is opened and is shared by all bookers of the process.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: sqlite3.Connection = None
+        # Planning and firing may run on different threads of a batch, daemon or claims server
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction on the store's connection, committed on success."""
+        with self._lock:
+            try:
+                if self._db is None:
+                    db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+                    # Leases only matter for minutes, durability is not worth an fsync per claim
+                    db.execute("PRAGMA synchronous = OFF")
+                    db.executescript(SCHEMA)
+                    self._db = db
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    yield self._db
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    if self._db.in_transaction:
+                        self._db.execute("ROLLBACK")
+                    raise
+            except sqlite3.Error as e:
+                raise ClaimStoreError(str(e)) from None
+
+    def join(self, booker: str, release_at: float):
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO bookers VALUES (?, ?)", (booker, release_at + BOOKER_LEASE_SECONDS))
+
+    def bookers(self) -> list[str]:
+        with self._transaction() as db:
+            db.execute("DELETE FROM bookers WHERE expires_at < ?", (time.time(),))
+            return [b for b, in db.execute("SELECT booker FROM bookers ORDER BY booker")]
+
+    def claim(self, booker: str, slot_start: str, resource_ids: list[str]) -> list[str]:
+        now = time.time()
+        with self._transaction() as db:
+            db.executemany("DELETE FROM claims WHERE slot_start = ? AND resource_id = ? AND expires_at < ?",
+                           [(slot_start, r_id, now) for r_id in resource_ids])
+            db.executemany("INSERT OR IGNORE INTO claims VALUES (?, ?, ?, ?)",
+                           [(slot_start, r_id, booker, now + CLAIM_LEASE_SECONDS) for r_id in resource_ids])
+            mine = {r_id for r_id, in db.execute("SELECT resource_id FROM claims WHERE slot_start = ? AND booker = ?",
+                                                 (slot_start, booker))}
+        return [r_id for r_id in resource_ids if str(r_id) in mine]
+
+    def release(self, booker: str, slot_start: str, resource_ids: list[str]):
+        with self._transaction() as db:
+            db.executemany("DELETE FROM claims WHERE slot_start = ? AND resource_id = ? AND booker = ?",
+                           [(slot_start, r_id, booker) for r_id in resource_ids])
+
+
+class RemoteClaimStore(ClaimStore):
+    """Leases kept by a claims server (see serve()), for bookers on several machines."""
+
+    def __init__(self, url: str, token: str = None):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        if token:
+            self.session.headers["authorization"] = f"Bearer {token}"
+
+    def _call(self, action: str, **body) -> dict:
+        try:
+            response = self.session.post(f"{self.url}/{action}", json=body, timeout=SERVER_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise ClaimStoreError(f"{type(e).__name__} from {self.url}") from None
+
+    def join(self, booker: str, release_at: float):
+        self._call("join", booker=booker, release_at=release_at)
+
+    def bookers(self) -> list[str]:
+        return self._call("bookers")["bookers"]
+
+    def claim(self, booker: str, slot_start: str, resource_ids: list[str]) -> list[str]:
+        held = set(self._call("claim", booker=booker, slot_start=slot_start, resource_ids=resource_ids)["held"])
+        return [r_id for r_id in resource_ids if str(r_id) in held]
+
+    def release(self, booker: str, slot_start: str, resource_ids: list[str]):
+        self._call("release", booker=booker, slot_start=slot_start, resource_ids=resource_ids)
+
+
+def open_store(process) -> ClaimStore | None:
+    """The claims store of the ProcessSettings `process`: DESK_CLAIMS_URL if set, else DESK_CLAIMS_PATH."""
+    if not process.use_desk_claims:
+        return None
+    if process.desk_claims_url:
+        return RemoteClaimStore(process.desk_claims_url, process.desk_claims_token)
+    return SqliteClaimStore(process.desk_claims_path)
+
+
+class DeskClaims:
+    """
+    Claims of one booker in a ClaimStore. A failing store never stops booking: claims
+    are then granted and the partition falls back to this booker alone.
+    """
+
+    def __init__(self, store: ClaimStore, booker: str):
+        self.store = store
+        self.booker = booker
+        self.bookers: list[str] = [booker]
+        self.skipped: set[tuple[str, str]] = set()  # (slot start, resource id) left to other bookers
+
+    @classmethod
+    def for_account(cls, store: ClaimStore, settings) -> "DeskClaims":
+        """Claims of the account of `settings`, which is the booker."""
+        return cls(store, f"{settings.sso_provider}:{settings.username}")
+
+    def join(self, release_at: float) -> bool:
+        """Take part in the release at unix time `release_at`."""
+        try:
+            self.store.join(self.booker, release_at)
+        except ClaimStoreError as e:
+            print(f"⚠️ Could not join desk claims: {e}")
+            return False
+        return True
+
+    def load_bookers(self) -> list[str]:
+        """Read the bookers taking part right now; the partition is fixed until the next call."""
+        try:
+            bookers = self.store.bookers()
+        except ClaimStoreError as e:
+            print(f"⚠️ Could not read desk claims: {e}")
+            bookers = []
+        self.bookers = bookers if self.booker in bookers else sorted(bookers + [self.booker])
+        self.skipped = set()
+        return self.bookers
+
+    def owner(self, resource_id: str) -> str:
+        # A hash of the id, so a desk keeps its owner however each booker ranks it and whichever page it is on
+        return self.bookers[zlib.crc32(resource_id.encode()) % len(self.bookers)]
+
+    def order(self, resource_ids: list[str]) -> list[str]:
+        """`resource_ids` with the desks assigned to this booker first, both parts in their original order."""
+        own = [r_id for r_id in resource_ids if self.owner(r_id) == self.booker]
+        return own + [r_id for r_id in resource_ids if self.owner(r_id) != self.booker]
+
+    def claim(self, slot_start: str, resource_ids: list[str]) -> list[str]:
+        """
+        Claim the desks for the slot at once. Returns the ones this booker holds now
+        (newly or already claimed by it), in the given order.
+        """
+        try:
+            held = self.store.claim(self.booker, slot_start, resource_ids)
+        except ClaimStoreError as e:
+            print(f"⚠️ Could not claim desks, trying them anyway: {e}")
+            return list(resource_ids)
+        self.skipped.update((slot_start, r_id) for r_id in resource_ids if r_id not in held)
+        return held
+
+    def release(self, slot_start: str, resource_ids: list[str]):
+        """Give back desks this booker claimed but no longer needs, e.g. the losers of a won race."""
+        try:
+            self.store.release(self.booker, slot_start, resource_ids)
+        except ClaimStoreError as e:
+            print(f"⚠️ Could not release desk claims: {e}")
+
+
+class ClaimsHandler(BaseHTTPRequestHandler):
+    """POST /join, /bookers, /claim and /release of a claims server, answered from a SqliteClaimStore."""
+
+    store: SqliteClaimStore = None
+    token: str = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if self.token and not hmac.compare_digest(self.headers.get("authorization") or "", f"Bearer {self.token}"):
+            return self._send(401, {"error": "unauthorized"})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("content-length") or 0)) or b"{}")
+            action = self.path.strip("/")
+            if action == "join":
+                self.store.join(body["booker"], float(body["release_at"]))
+                return self._send(200, {})
+            if action == "bookers":
+                return self._send(200, {"bookers": self.store.bookers()})
+            if action == "claim":
+                return self._send(200, {"held": self.store.claim(body["booker"], body["slot_start"],
+                                                                 [str(r_id) for r_id in body["resource_ids"]])})
+            if action == "release":
+                self.store.release(body["booker"], body["slot_start"], [str(r_id) for r_id in body["resource_ids"]])
+                return self._send(200, {})
+            self._send(404, {"error": "not found"})
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {"error": f"invalid request ({type(e).__name__})"})
+        except ClaimStoreError as e:
+            self._send(503, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str, port: int, path: str, token: str = None):
+    ClaimsHandler.store = SqliteClaimStore(path)
+    ClaimsHandler.token = token
+    server = ThreadingHTTPServer((host, port), ClaimsHandler)
+    print(f"ℹ️ Claims server listening on http://{host}:{port}, leases in {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("serve",))
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for other machines)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--path", default=".anny_claims.db", help="SQLite file the leases are kept in")
+    parser.add_argument("--token", default=os.getenv("DESK_CLAIMS_TOKEN"),
+                        help="Bearer token the bookers must send (default: DESK_CLAIMS_TOKEN)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.path, args.token)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,210 +1,549 @@
+import contextvars
+import datetime
+import time
 import requests
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import JSONDecodeError
-from config.constants import RESOURCE_URL, BOOKING_API_BASE, CHECKOUT_FORM_API, ANNY_BASE_URL, SERVICE_ID
+from config.settings import Settings
+from booking.api import (
+    api_headers, all_resources_url, discovery_params, children_params, has_next_page, last_page, bookings_url,
+    bookings_params, parse_bookings, parse_available_resources, AVAILABILITY_PAGE_SIZE,
+    parse_bookable_resources, select_bookable_resources, resource_group_urls,
+    availability_params, order_params, order_payload, parse_order, parse_customer, finalize_payload, error_summary,
+    error_title
+)
+from booking.retry import RetryPolicy, classify, outcome_unknown, QUOTA, TAKEN
+from utils.http import TimedHTTPAdapter
+from utils.tracing import tracer
 
 
 class CheckoutException(Exception):
     pass
 
 
+class AvailabilityStream:
+    """
+    The pages of one availability lookup, handed out as they arrive. The first page
+    is there from the start, the later ones may still be loading in the background.
+    """
+
+    def __init__(self, first: list[dict], later: list[futures.Future] = None):
+        self._first = first
+        self._pending = list(later or [])
+
+    def take(self, wait=False) -> list[dict] | None:
+        """
+        Resources of the pages that arrived since the last call ([] if none did). With
+        `wait`, blocks until another page arrived if none has. Returns None once every
+        page has been taken.
+        """
+        if self._first is None and not self._pending:
+            return None
+        if wait and self._first is None:
+            futures.wait(self._pending, return_when=futures.FIRST_COMPLETED)
+
+        resources, self._first = self._first or [], None
+        for future in [f for f in self._pending if f.done()]:
+            self._pending.remove(future)
+            try:
+                resources += future.result() or []
+            except requests.RequestException as e:
+                print(f"⚠️ Failed to fetch a page of available resources: {e}")
+        return resources
+
+    def all(self) -> list[dict]:
+        """Wait for every page and return all available resources."""
+        resources = []
+        while (page := self.take(wait=True)) is not None:
+            resources += page
+        return resources
+
+
 class BookingClient:
-    def __init__(self, cookies, customer_account_id=None):
-        self.session = requests.Session()
+    def __init__(self, cookies, customer_account_id=None, resource_url=None, service_id=None,
+                 settings: Settings = None, resource_groups: list[tuple[str, str]] = None,
+                 session: requests.Session = None):
+        """
+        `resource_url` and `service_id` default to those of `settings`, `resource_groups`
+        ((resource path, service id) pairs searched after them) to RESOURCE_GROUPS.
+        Without any of them, discover_resource_config() has to find them.
+        `session` is the logged-in AnnySession's session to take over, so booking reuses
+        its connection pool (and the connections the login opened).
+        """
+        self.settings = settings = settings or Settings()
+        adapter = session and session.get_adapter('https://')
+        if isinstance(adapter, TimedHTTPAdapter):
+            self.session, self.adapter = session, adapter
+            # Drop the login's HTML and inertia headers, the API headers are set below
+            self.session.headers = requests.utils.default_headers()
+        else:
+            self.session = requests.Session()
+            # One pooled connection per availability worker, so concurrent lookups don't queue
+            self.adapter = TimedHTTPAdapter(pool_maxsize=max(settings.availability_workers, 10))
+            self.session.mount('https://', self.adapter)
+            self.session.mount('http://', self.adapter)
         self.session.cookies = cookies
         self.token = cookies.get('anny_shop_jwt')
-        self.resource_url = RESOURCE_URL
-        self.service_id = SERVICE_ID
+        # (availability url, service id) of every resource group searched, in priority order
+        self.groups = resource_group_urls(
+            settings.booking_api_base, resource_url or settings.resource_url, service_id or settings.service_id,
+            settings.resource_groups if resource_groups is None else resource_groups
+        )
+        self.services = {}  # resource id -> service id of the group it was found in
+        # Customer profile of the checkout form; once known, finalize follows order creation directly
+        self.customer = None
         self.customer_account_id = customer_account_id
+        self.include_profile = settings.include_profile
+        self.retry = RetryPolicy(settings.retry_budget_seconds, settings.retry_base_delay_ms / 1000,
+                                 settings.retry_max_delay_ms / 1000)
+
+        self.session.headers.update(api_headers(self.token, settings.anny_base_url))
+
+    @property
+    def resource_url(self):
+        return self.groups[0][0] if self.groups else None
 
-        self.session.headers.update({
-            'authorization': f'Bearer {self.token}',
-            'accept': 'application/vnd.api+json',
-            'content-type': 'application/vnd.api+json',
-            'origin': ANNY_BASE_URL,
-            'referer': ANNY_BASE_URL + '/',
-            'user-agent': 'Mozilla/5.0'
-        })
-
-    def discover_resource_config(self):
-        """Attempt to discover RESOURCE_URL_PATH and SERVICE_ID from the Anny API."""
+    @property
+    def service_id(self):
+        return self.groups[0][1] if self.groups else None
+
+    def check_auth(self):
+        """Cheaply verify that the bearer token is still accepted by the booking API."""
         if not self.customer_account_id:
-            print("❌ Could not determine customer account ID from login. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
-            return False
+            return True
 
         response = self.session.get(
-            f"{BOOKING_API_BASE}/customer-accounts/{self.customer_account_id}/all-resources",
-            params={
-                'page[number]': 1,
-                'page[size]': 50,
-                'sort': 'name',
-                'include': 'services',
-            }
+            all_resources_url(self.settings.booking_api_base, self.customer_account_id),
+            params={'page[number]': 1, 'page[size]': 1},
+            timeout=10
         )
-        if not response.ok:
-            print(f"❌ Failed to discover resources: HTTP {response.status_code}")
-            return False
+        return response.status_code not in (401, 403)
 
-        try:
-            body = response.json()
-        except (ValueError, JSONDecodeError):
-            print("❌ Invalid JSON response when discovering resources")
+    def keep_alive(self):
+        """Send a cheap request to b.anny.eu so the pooled connection stays open and warm."""
+        url = self.resource_url or all_resources_url(self.settings.booking_api_base, self.customer_account_id)
+        self.session.get(url, params={'page[number]': 1, 'page[size]': 1}, timeout=5)
+
+    def discover_resource_config(self, index=None):
+        """
+        Attempt to discover RESOURCE_URL_PATH and SERVICE_ID from the Anny API.
+        If a ResourceIndex is given, a fresh on-disk index is used without any request,
+        and a missing or stale one is rebuilt.
+        """
+        if not self.customer_account_id:
+            print("❌ Could not determine customer account ID from login. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
             return False
 
-        resources = body.get('data', [])
+        with tracer.span("discovery") as span:
+            if index:
+                data = index.load(self.customer_account_id) or index.refresh(self)
+                if not data:
+                    span.fail()
+                    return False
+                bookable = index.bookable(data)
+            else:
+                resources = self.fetch_all_resources()
+                if resources is None:
+                    span.fail()
+                    return False
+                bookable = parse_bookable_resources(resources[0])
+
+            selected = select_bookable_resources(bookable, self.settings.booking_api_base,
+                                                 self.settings.use_all_resource_groups)
+            if not selected:
+                span.fail()
+                return False
+
+            self.groups = selected
+            span.set(resource_url=self.resource_url, service_id=self.service_id, groups=len(selected))
+            return True
+
+    def fetch_all_resources(self):
+        """Return (resources, included services) of every page of the account's resources, or None."""
+        url = all_resources_url(self.settings.booking_api_base, self.customer_account_id)
+        return self._get_all_pages(url, discovery_params, 50)
+
+    def fetch_children(self, resource_path):
+        """Return every child resource (desk) of a parent resource, or None."""
+        pages = self._get_all_pages(f"{self.settings.booking_api_base}{resource_path}/children", children_params, 250)
+        return pages[0] if pages else None
+
+    def fetch_bookings(self):
+        """Return the account's upcoming bookings (id, resource_id, start, end), or None."""
+        if not self.customer_account_id:
+            return None
+        url = bookings_url(self.settings.booking_api_base, self.customer_account_id)
+        pages = self._get_all_pages(url, bookings_params, 100, "fetch bookings")
+        return parse_bookings(pages[0]) if pages else None
+
+    def _get_all_pages(self, url, params, page_size, action="discover resources"):
+        data, included = [], []
+        page = 1
+        while True:
+            try:
+                response = self.session.get(url, params=params(page), timeout=10)
+            except requests.RequestException as e:
+                print(f"❌ Failed to {action}: network error ({type(e).__name__})")
+                return None
+            if not response.ok:
+                print(f"❌ Failed to {action}: HTTP {response.status_code}")
+                return None
+
+            try:
+                body = response.json()
+            except (ValueError, JSONDecodeError):
+                print(f"❌ Invalid JSON response when trying to {action}")
+                return None
+
+            data += body.get('data', [])
+            included += body.get('included', [])
+            if not has_next_page(body, page, page_size):
+                return data, included
+            page += 1
 
-        # Only keep parent resources (has_children=true) — these have individual desks
-        # as children and match the /resources/{slug}/children URL pattern.
-        bookable = []
-        for r in resources:
-            if not r.get('attributes', {}).get('has_children'):
+    def find_available_resources(self, start, end, deadline=None):
+        """Return every available resource of a slot (all groups and pages), or None if the lookup failed."""
+        stream = self.stream_available_resources(start, end, deadline)
+        return stream.all() if stream else None
+
+    def stream_available_resources(self, start, end, deadline=None):
+        """
+        Look up the available resources of a slot in every resource group at once, page
+        by page. As soon as the first page of a group tells how many follow, all later
+        pages are requested at once; the returned AvailabilityStream hands out each page
+        as it arrives, so booking can start on the first ones. Returns None if the first
+        page of no group could be fetched.
+        """
+        firsts = self._in_background([(self._get_availability_page, group, start, end, 1, deadline)
+                                      for group in range(len(self.groups))])
+        resources, later, failed = [], [], 0
+        for group, future in enumerate(firsts):
+            try:
+                first = future.result()
+            except requests.RequestException as e:
+                print(f"❌ Failed to fetch resources of {self.groups[group][0]}: {e}")
+                first = None
+            if first is None:
+                failed += 1
                 continue
-            svc_refs = r.get('relationships', {}).get('services', {}).get('data', [])
-            if not svc_refs:
+            resources += first[0]
+            later += self._fetch_later_pages(group, start, end, first[1], deadline)
+        if failed == len(self.groups):
+            return None
+        return AvailabilityStream(resources, later)
+
+    def _in_background(self, calls):
+        """
+        Start every (function, *args) call in a pool of availability workers, each in a copy
+        of the caller's context so its spans are nested under the caller's. Returns the futures.
+        """
+        if not calls:
+            return []
+        pool = ThreadPoolExecutor(max_workers=min(self.settings.availability_workers, len(calls)))
+        started = [pool.submit(contextvars.copy_context().run, *call) for call in calls]
+        pool.shutdown(wait=False)
+        return started
+
+    def _get_availability_page(self, group, start, end, page, deadline=None):
+        """Return (resources, response body) of one page of an availability lookup in a resource group, or None."""
+        resource_url, service_id = self.groups[group]
+        with tracer.span("availability", start=start, end=end, page=page, group=group) as span:
+            response = self.retry.call(
+                "availability",
+                lambda timeout: self.session.get(resource_url, params=availability_params(start, end, service_id, page),
+                                                 timeout=timeout),
+                deadline
+            )
+            if not response.ok:
+                span.fail(f"HTTP {response.status_code}")
+                print(f"❌ Failed to fetch resources: HTTP {response.status_code}")
+                return None
+            try:
+                body = response.json()
+            except (ValueError, JSONDecodeError):
+                span.fail("invalid JSON")
+                print(f"❌ Invalid JSON response when fetching resources: {response.text[:200]}")
+                return None
+            resources = self._parse_available(body, group)
+            span.set(available=len(resources))
+            return resources, body
+
+    def _parse_available(self, body, group):
+        resources = parse_available_resources(body.get('data', []), group, self.groups[group][1])
+        # Orders for these resources have to name the service of their group
+        self.services.update((r["id"], r["service_id"]) for r in resources)
+        return resources
+
+    def _fetch_later_pages(self, group, start, end, first_body, deadline=None):
+        """Request every availability page of a group after the first one at once. Returns their futures."""
+        last = last_page(first_body)
+        if last:
+            calls = [(self._get_available_page, group, start, end, page, deadline) for page in range(2, last + 1)]
+        elif has_next_page(first_body, 1, AVAILABILITY_PAGE_SIZE):
+            # Without a page count the later pages can only be followed one after another
+            calls = [(self._follow_available_pages, group, start, end, 2, deadline)]
+        else:
+            calls = []
+        return self._in_background(calls)
+
+    def _get_available_page(self, group, start, end, page, deadline=None):
+        result = self._get_availability_page(group, start, end, page, deadline)
+        return result[0] if result else None
+
+    def _follow_available_pages(self, group, start, end, page, deadline=None):
+        resources = []
+        while result := self._get_availability_page(group, start, end, page, deadline):
+            resources += result[0]
+            if not has_next_page(result[1], page, AVAILABILITY_PAGE_SIZE):
+                break
+            page += 1
+        return resources
+
+    def poll_available_resources(self, start, end, etag=None):
+        """
+        Single availability lookup for polling, without retries. Sends If-None-Match if
+        the ETag of the previous response is given. Returns (response, resources) like
+        find_available_resources(); the resources are None if nothing changed (304)
+        or the lookup failed. The ETag only covers the first page of the first resource
+        group, so it is only sent if there is one group; later pages and the other
+        groups are fetched whenever it changed.
+        """
+        resource_url, service_id = self.groups[0]
+        headers = {'if-none-match': etag} if etag and len(self.groups) == 1 else {}
+        with tracer.span("availability_poll", start=start, end=end) as span:
+            response = self.session.get(
+                resource_url, params=availability_params(start, end, service_id), headers=headers, timeout=10
+            )
+            span.set(status_code=response.status_code)
+            if response.status_code == 304 or not response.ok:
+                return response, None
+            try:
+                body = response.json()
+            except (ValueError, JSONDecodeError):
+                span.fail("invalid JSON")
+                return response, None
+            resources = self._parse_available(body, 0)
+
+        later = self._fetch_later_pages(0, start, end, body)
+        later += self._in_background([(self._follow_available_pages, group, start, end, 1)
+                                      for group in range(1, len(self.groups))])
+        return response, AvailabilityStream(resources, later).all()
+
+    def find_available_resources_many(self, slots, stream=False):
+        """
+        Query availability for several (start, end) slots at once.
+
+        Returns a dict mapping each (start, end) tuple to the list of available
+        resources (see find_available_resources()), or None if the lookup failed. Iterating over it yields the
+        slots in the order they were passed in, so slot priority is kept. With `stream`, the values are
+        AvailabilityStreams instead, returned once the first page of every slot has arrived.
+        """
+        slots = list(dict.fromkeys(slots))
+        if not slots:
+            return {}
+
+        lookup = self.stream_available_resources if stream else self.find_available_resources
+        with ThreadPoolExecutor(max_workers=min(self.settings.availability_workers, len(slots))) as pool:
+            # Each lookup runs in a copy of the caller's context, so its span is nested under the caller's
+            lookups = [pool.submit(contextvars.copy_context().run, lookup, start, end) for start, end in slots]
+
+        results = {}
+        for slot, future in zip(slots, lookups):
+            try:
+                results[slot] = future.result()
+            except requests.RequestException as e:
+                print(f"❌ Failed to fetch resources for {slot[0]} - {slot[1]}: {e}")
+                results[slot] = None
+        return results
+
+    def reserve(self, resource_id, start, end, deadline=None):
+        """
+        Book one resource. Transient errors are retried until `deadline` (monotonic,
+        default: the retry budget from now). Returns False if the resource could not
+        be booked, also after a network error; raises CheckoutException if the booking
+        limit is reached.
+        """
+        with tracer.span("reserve", resource_id=resource_id) as span:
+            order = self._try_create_order(resource_id, start, end, deadline)
+            if not order:
+                span.fail()
+                return False
+            oid, oat = order
+
+            cached = self.customer is not None
+            customer = self.customer if cached else self._fetch_customer(oid, oat, deadline)
+            if customer is None:
+                span.fail()
+                self._clear_order(oid, oat)
+                return False
+
+            self._finalize(resource_id, oid, oat, customer, start, end, deadline, cached)
+            return True
+
+    def reserve_race(self, resource_ids, start, end, fan_out=3, deadline=None):
+        """
+        Race up to `fan_out` candidates at once: create an order for each of them
+        concurrently, finalize the highest-priority one that was created and clear
+        the other pending orders so they don't hold the booking quota.
+        Falls through to the next `fan_out` candidates if none could be created.
+
+        Returns the booked resource id, or None if no candidate could be booked.
+        Raises CheckoutException if finalizing the winner fails.
+        """
+        for offset in range(0, len(resource_ids), fan_out):
+            batch = resource_ids[offset:offset + fan_out]
+            started = time.monotonic()
+
+            with ThreadPoolExecutor(max_workers=len(batch)) as pool:
+                orders = list(pool.map(
+                    lambda r_id, context: context.run(self._try_create_order, r_id, start, end, deadline),
+                    batch, [contextvars.copy_context() for _ in batch]
+                ))
+
+            created = [(r_id, order) for r_id, order in zip(batch, orders) if order]
+            if not created:
+                print(f"  No order could be created for candidates {offset + 1}-{offset + len(batch)}/{len(resource_ids)}")
                 continue
-            slug = r.get('attributes', {}).get('slug') or r['id']
-            bookable.append((f"/resources/{slug}", svc_refs[0]['id']))
 
-        if not bookable:
-            print("❌ No bookable resources found. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
-            return False
+            (winner, (oid, oat)), losers = created[0], created[1:]
+            created_after = time.monotonic() - started
 
-        if len(bookable) > 1:
-            print("ℹ️ Multiple bookable resources found. Using the first one automatically.")
-            print("   To use a specific one, set these in your .env:")
-            for resource_path, service_id in bookable:
-                print(f"   RESOURCE_URL_PATH={resource_path}/children")
-                print(f"   SERVICE_ID={service_id}")
-                print()
-
-        resource_path, service_id = bookable[0]
-        self.resource_url = f"{BOOKING_API_BASE}{resource_path}/children"
-        self.service_id = service_id
-
-        print(f"✅ Auto-discovered: RESOURCE_URL_PATH={resource_path}/children, SERVICE_ID={service_id}")
-        return True
-
-    def find_available_resources(self, start, end):
-        response = self.session.get(self.resource_url, params={
-            'page[number]': 1,
-            'page[size]': 250,
-            'filter[available_from]': start,
-            'filter[available_to]': end,
-            'filter[availability_exact_match]': 1,
-            'filter[exclude_hidden]': 0,
-            'filter[exclude_child_resources]': 0,
-            'filter[availability_service_id]': int(self.service_id),
-            'filter[include_unavailable]': 0,
-            'filter[pre_order_ids]': '',
-            'sort': 'name'
-        })
-        if not response.ok:
-            print(f"❌ Failed to fetch resources: HTTP {response.status_code}")
-            return None
+            # Release the losing orders while the winner's checkout form is loading (if it is needed)
+            cached = self.customer is not None
+            with ThreadPoolExecutor(max_workers=len(losers) + 1) as pool:
+                if not cached:
+                    customer_future = pool.submit(contextvars.copy_context().run,
+                                                  self._fetch_customer, oid, oat, deadline)
+                for _, (loser_oid, loser_oat) in losers:
+                    pool.submit(contextvars.copy_context().run, self._clear_order, loser_oid, loser_oat)
+                customer = self.customer if cached else customer_future.result()
+
+            if customer is None:
+                self._clear_order(oid, oat)
+                continue
+
+            self._finalize(winner, oid, oat, customer, start, end, deadline, cached)
+            print(f"🏁 Race won by resource {winner} (candidate {resource_ids.index(winner) + 1}/{len(resource_ids)}): "
+                  f"order after {created_after * 1000:.0f} ms, booked after {(time.monotonic() - started) * 1000:.0f} ms")
+            return winner
+
+        return None
+
+    def _try_create_order(self, resource_id, start, end, deadline=None):
         try:
-            resources = response.json().get('data', [])
-        except (ValueError, JSONDecodeError):
-            print(f"❌ Invalid JSON response when fetching resources: {response.text[:200]}")
+            return self._create_order(resource_id, start, end, deadline)
+        except requests.RequestException as e:
+            print(f"❌ Booking request failed for resource {resource_id}: {e}")
             return None
-        return [r['id'] for r in resources]
-
-    def reserve(self, resource_id, start, end):
-        booking = self.session.post(
-            f"{BOOKING_API_BASE}/order/bookings",
-            params={
-                'stateless': '1',
-                'include': 'customer,voucher,bookings.booking_add_ons.add_on.cover_image,bookings.sub_bookings.resource,bookings.sub_bookings.service,bookings.customer,bookings.service.custom_forms.custom_fields,bookings.service.add_ons.cover_image,bookings.service.add_ons.group,bookings.cancellation_policy,bookings.resource.cover_image,bookings.resource.parent,bookings.resource.location,bookings.resource.category,bookings.reminders,bookings.booking_series,bookings.sequenced_bookings.resource,bookings.sequenced_bookings.service,bookings.sequenced_bookings.service.add_ons.cover_image,bookings.sequenced_bookings.service.add_ons.group,bookings.booking_participants,sub_orders.bookings,sub_orders.organization.legal_documents'
-            },
-            json={
-                "resource_id": [resource_id],
-                "service_id": {self.service_id: 1},
-                "start_date": start,
-                "end_date": end,
-                "description": "",
-                "customer_note": "",
-                "add_ons_by_service": {self.service_id: [[]]},
-                "sub_bookings_by_service": {},
-                "strategy": "multi-resource"
-            }
+
+    def _create_order(self, resource_id, start, end, deadline=None):
+        """
+        Put the resource into a new pending order. Returns (order id, order access token) or None.
+        Raises CheckoutException if the server reports that the booking limit is reached.
+        """
+        with tracer.span("order_create", resource_id=resource_id, start=start, end=end) as span:
+            order = self._post_order(resource_id, start, end, deadline)
+            if not order:
+                span.fail()
+            return order
+
+    def _post_order(self, resource_id, start, end, deadline=None):
+        booking = self.retry.call(
+            "order",
+            lambda timeout: self.session.post(
+                f"{self.settings.booking_api_base}/order/bookings",
+                params=order_params(profile=self.include_profile),
+                json=order_payload(resource_id, self.services.get(resource_id, self.service_id), start, end),
+                timeout=timeout
+            ),
+            deadline,
+            idempotent=False
         )
 
         if not booking.ok:
             print(f"❌ Booking failed: HTTP {booking.status_code}")
-            try:
-                errors = booking.json().get("errors", {})
-                print(f"  {errors[0]['title']}: {errors[0]['detail']}")
-                print(f"  resource_id: {resource_id}; start: {start}; end: {end}")
-            except:
-                pass
-            return False
+            self._print_error(booking, resource_id, start, end)
+            if outcome_unknown(booking):
+                # Not repeated: a second order could hold the quota without us knowing its access token
+                print("  The order may have been created anyway; anny releases it after 15 minutes.")
+            if classify(booking) == QUOTA:
+                raise CheckoutException
+            return None
 
         try:
-            data = booking.json().get("data", {})
+            order = parse_order(booking.json())
         except (ValueError, JSONDecodeError):
             print("❌ Invalid JSON response from booking request.")
             print(f"  resource_id: {resource_id}; start: {start}; end: {end}")
             print(f"  response: {booking.text[:200]}")
-            return False
-
-        oid = data.get("id")
-        oat = data.get("attributes", {}).get("access_token")
+            return None
 
-        if not oid or not oat:
+        if not order:
             print("❌ Missing booking ID or access token in response")
-            return False
+            return None
 
-        checkout = self.session.get(f"{CHECKOUT_FORM_API}?oid={oid}&oat={oat}&stateless=1")
-        if not checkout.ok:
-            print(f"❌ Checkout form failed: HTTP {checkout.status_code}")
-            return False
+        return order
 
-        try:
-            customer = checkout.json().get("default", {}).get("customer", {})
-        except (ValueError, JSONDecodeError):
-            print(f"❌ Invalid JSON response from checkout form: {checkout.text[:200]}")
-            return False
-
-        final = self.session.post(
-            f"{BOOKING_API_BASE}/order",
-            params={
-                "stateless": "1",
-                "include": "customer,voucher,bookings.booking_add_ons.add_on.cover_image,bookings.sub_bookings.resource,bookings.sub_bookings.service,bookings.customer,bookings.service.custom_forms.custom_fields,bookings.service.add_ons.cover_image,bookings.service.add_ons.group,bookings.cancellation_policy,bookings.resource.cover_image,bookings.resource.parent,bookings.resource.location,bookings.resource.category,bookings.reminders,bookings.booking_series,bookings.sequenced_bookings.resource,bookings.sequenced_bookings.service,bookings.sequenced_bookings.service.add_ons.cover_image,bookings.sequenced_bookings.service.add_ons.group,bookings.booking_participants,sub_orders.bookings,sub_orders.organization.legal_documents",
-                "oid": oid,
-                "oat": oat
-            },
-            json={
-                "customer": {
-                    "given_name": customer.get("given_name"),
-                    "family_name": customer.get("family_name"),
-                    "email": customer.get("email")
-                },
-                "accept_terms": True,
-                "payment_method": "",
-                "success_url": f"{ANNY_BASE_URL}/checkout/success?oids={oid}&oats={oat}",
-                "cancel_url": f"{ANNY_BASE_URL}/checkout?step=checkout&childResource={resource_id}",
-                "meta": {"timezone": "Europe/Berlin"}
-            }
-        )
+    def _fetch_customer(self, oid, oat, deadline=None):
+        with tracer.span("checkout_form") as span:
+            try:
+                checkout = self.retry.call(
+                    "checkout-form",
+                    lambda timeout: self.session.get(
+                        f"{self.settings.checkout_form_api}?oid={oid}&oat={oat}&stateless=1", timeout=timeout
+                    ),
+                    deadline
+                )
+            except requests.RequestException as e:
+                span.fail(type(e).__name__)
+                print(f"❌ Checkout form failed: network error ({type(e).__name__})")
+                return None
+            if not checkout.ok:
+                span.fail(f"HTTP {checkout.status_code}")
+                print(f"❌ Checkout form failed: HTTP {checkout.status_code}")
+                return None
 
-        if not final.ok:
-            print(f"❌ Checkout failed: HTTP {final.status_code}")
             try:
-                errors = final.json().get("errors", {})
-                print(f"  {errors[0]['title']}: {errors[0]['detail']}")
-                print(f"  resource_id: {resource_id}; start: {start}; end: {end}")
-            except:
-                pass
-
-            # Clear checkout cart
-            clear_checkout = self.session.get(
-                f"{BOOKING_API_BASE}/order/bookings/delete-all",
-                params={
-                    "stateless": "1",
-                    "include": "customer,voucher,bookings.booking_add_ons.add_on.cover_image,bookings.sub_bookings.resource,bookings.sub_bookings.service,bookings.customer,bookings.service.custom_forms.custom_fields,bookings.service.add_ons.cover_image,bookings.service.add_ons.group,bookings.cancellation_policy,bookings.resource.cover_image,bookings.resource.parent,bookings.resource.location,bookings.resource.category,bookings.reminders,bookings.booking_series,bookings.sequenced_bookings.resource,bookings.sequenced_bookings.service,bookings.sequenced_bookings.service.add_ons.cover_image,bookings.sequenced_bookings.service.add_ons.group,bookings.booking_participants,sub_orders.bookings,sub_orders.organization.legal_documents",
-                    "oid": oid,
-                    "oat": oat
-                }
-            )
-            if clear_checkout.ok:
+                customer = parse_customer(checkout.json())
+            except (ValueError, JSONDecodeError, AttributeError):
+                span.fail("invalid JSON")
+                print(f"❌ Invalid JSON response from checkout form: {checkout.text[:200]}")
+                return None
+            if customer is None:
+                span.fail("incomplete customer profile")
+                print("❌ Checkout form has no complete customer profile (name and email), check your anny account")
+                return None
+            # Only a complete profile is kept for the next checkouts
+            self.customer = customer
+            return customer
+
+    def _finalize(self, resource_id, oid, oat, customer, start, end, deadline=None, cached=False):
+        # A CheckoutException raised from the block marks the span as failed
+        with tracer.span("finalize", resource_id=resource_id, start=start, end=end, cached_customer=cached):
+            self._post_finalize(resource_id, oid, oat, customer, start, end, deadline, cached)
+
+    def _post_finalize(self, resource_id, oid, oat, customer, start, end, deadline=None, cached=False):
+        final = self._send_finalize(resource_id, oid, oat, customer, deadline)
+
+        if cached and final is not None and not final.ok and not outcome_unknown(final) \
+                and classify(final) not in (QUOTA, TAKEN):
+            print(f"ℹ️ Checkout with the cached customer profile failed (HTTP {final.status_code}), "
+                  f"loading the checkout form...")
+            customer = self._fetch_customer(oid, oat, deadline)
+            if customer is not None:
+                final = self._send_finalize(resource_id, oid, oat, customer, deadline)
+
+        if outcome_unknown(final) and self._is_booked(resource_id, start):
+            print("ℹ️ Checkout got no clear answer, but the booking exists.")
+        elif final is None or not final.ok:
+            if final is None:
+                print("❌ Checkout failed: no response")
+            else:
+                print(f"❌ Checkout failed: HTTP {final.status_code}")
+                self._print_error(final, resource_id, start, end)
+
+            if self._clear_order(oid, oat):
                 print(f"  Checkout cart has been cleared. Booking quota should be restored.")
             else:
                 print(f"  Checkout cart could not be cleared. You might need to wait 15 minutes for your booking quota to be restored automatically again.")
@@ -213,4 +552,60 @@ class BookingClient:
 
         print("✅ Reservation successful!")
         print(f"  resource_id: {resource_id}; start: {start}; end: {end}")
-        return True
+
+    def _send_finalize(self, resource_id, oid, oat, customer, deadline=None):
+        """The checkout response, or None if the request failed on the network after it may have been sent."""
+        try:
+            return self.retry.call(
+                "finalize",
+                lambda timeout: self.session.post(
+                    f"{self.settings.booking_api_base}/order",
+                    params=order_params(oid, oat, self.include_profile),
+                    json=finalize_payload(resource_id, oid, oat, customer, self.settings.anny_base_url,
+                                          self.settings.timezone),
+                    timeout=timeout
+                ),
+                deadline,
+                idempotent=False
+            )
+        except requests.RequestException as e:
+            print(f"⚠️ Checkout request failed ({type(e).__name__})")
+            return None
+
+    def _is_booked(self, resource_id, start):
+        """Whether the account's bookings contain the resource at `start`: re-reads a checkout of unknown outcome."""
+        bookings = self.fetch_bookings()
+        start = datetime.datetime.fromisoformat(start)
+        return any(
+            b["resource_id"] == resource_id and b["start"] and datetime.datetime.fromisoformat(b["start"]) == start
+            for b in bookings or []
+        )
+
+    def _clear_order(self, oid, oat):
+        """Delete all bookings of a pending order so it no longer counts against the booking quota."""
+        with tracer.span("clear_order"):
+            try:
+                clear_checkout = self.session.get(
+                    f"{self.settings.booking_api_base}/order/bookings/delete-all",
+                    params=order_params(oid, oat, self.include_profile),
+                    timeout=10
+                )
+            except requests.RequestException:
+                return False
+            return clear_checkout.ok
+
+    @staticmethod
+    def _print_error(response, resource_id, start, end):
+        try:
+            body = response.json()
+        except (ValueError, JSONDecodeError):
+            body = None
+        # Kept on the order_create/finalize span for the run history
+        span = tracer.current()
+        if span:
+            span.set(error_title=error_title(body) or f"HTTP {response.status_code}")
+
+        summary = error_summary(body)
+        if summary:
+            print(f"  {summary}")
+            print(f"  resource_id: {resource_id}; start: {start}; end: {end}")
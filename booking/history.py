@@ -0,0 +1,283 @@
+"""
+Local history of booking runs: one row per run and account, per availability
+query and per reserve attempt, taken from the run's trace.
+
+    python -m booking.history               summary of the last 30 days
+    python -m booking.history desks         win rate and latency per desk
+    python -m booking.history runs          the most recent runs
+    python -m booking.history slots         desks found free and lost per slot
+"""
+import argparse
+import datetime
+import sqlite3
+import statistics
+from contextlib import contextmanager
+
+from config.settings import load_process_settings
+from utils.tracing import Tracer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    trace_id TEXT,
+    account TEXT,
+    trigger TEXT,
+    release TEXT,
+    started_at REAL,
+    fire_ms REAL,
+    first_booked_ms REAL,
+    slots INTEGER,
+    booked INTEGER
+);
+CREATE TABLE IF NOT EXISTS queries (
+    run_id INTEGER REFERENCES runs(id),
+    slot_start TEXT,
+    slot_end TEXT,
+    started_at REAL,
+    latency_ms REAL,
+    available INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    run_id INTEGER REFERENCES runs(id),
+    resource_id TEXT,
+    slot_start TEXT,
+    slot_end TEXT,
+    started_at REAL,
+    latency_ms REAL,
+    outcome TEXT,
+    error_title TEXT
+);
+CREATE INDEX IF NOT EXISTS attempts_resource ON attempts(resource_id);
+"""
+
+# Outcomes of a reserve attempt
+BOOKED = "booked"          # order created and checked out
+REJECTED = "rejected"      # order created, checkout refused (mostly the booking limit)
+RELEASED = "released"      # order created and cleared again (race lost or checkout form failed)
+LIMIT = "limit"            # order refused for the booking limit
+FAILED = "failed"          # order refused, e.g. because the desk was taken
+
+
+def attempts_of(nested: list) -> list[dict]:
+    """Reserve attempts among the spans of one fire phase, with their outcome."""
+    finalized = {(s.attributes.get("resource_id"), s.attributes.get("start")): s
+                 for s in nested if s.name == "finalize"}
+    attempts = []
+    for order in (s for s in nested if s.name == "order_create"):
+        key = (order.attributes.get("resource_id"), order.attributes.get("start"))
+        final = finalized.get(key)
+        if order.status == "error":
+            outcome = LIMIT if order.attributes.get("error") == "CheckoutException" else FAILED
+            error = order.attributes.get("error_title")
+        elif final is None:
+            outcome, error = RELEASED, None
+        else:
+            outcome = BOOKED if final.status == "ok" else REJECTED
+            error = final.attributes.get("error_title")
+        attempts.append({
+            "span": order,
+            "resource_id": key[0],
+            "start": key[1],
+            "end": order.attributes.get("end"),
+            "latency": ((final or order).end or order.end) - order.start,
+            "outcome": outcome,
+            "error": error,
+        })
+    return attempts
+
+
+def availability_lookups(nested: list) -> list[list]:
+    """The "availability" spans of one fire phase, grouped into one list of pages per slot."""
+    lookups = {}
+    for span in (s for s in nested if s.name == "availability"):
+        lookups.setdefault((span.attributes.get("start"), span.attributes.get("end")), []).append(span)
+    return list(lookups.values())
+
+
+class RunHistory:
+    """
+    Append-only SQLite store of past runs.
+
+    Nothing is written while booking: `add_trace()` turns the spans the tracer
+    collected anyway into rows and keeps them in memory, `flush()` writes them in
+    one transaction once the run is over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pending: list[tuple[dict, list[tuple], list[tuple]]] = []
+
+    @contextmanager
+    def _connect(self):
+        """Connection that commits on success and is closed afterwards."""
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            db.executescript(SCHEMA)
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def add_trace(self, tracer: Tracer, release: datetime.datetime = None, trigger: str = None):
+        """Buffer one run per fire phase of the trace."""
+        for fire, nested in tracer.fires():
+            attempts = attempts_of(nested)
+            booked_after = [a["span"].start + a["latency"] - fire.start for a in attempts if a["outcome"] == BOOKED]
+            run = {
+                "trace_id": tracer.trace_id,
+                "account": fire.attributes.get("account"),
+                "trigger": trigger,
+                "release": release.isoformat() if release else None,
+                "started_at": tracer.wall_time(fire.start),
+                "fire_ms": round(fire.duration * 1000, 1),
+                "first_booked_ms": round(min(booked_after) * 1000, 1) if booked_after else None,
+                "slots": fire.attributes.get("slots"),
+                "booked": sum(a["outcome"] == BOOKED for a in attempts),
+            }
+            queries = [(
+                pages[0].attributes.get("start"), pages[0].attributes.get("end"), tracer.wall_time(pages[0].start),
+                round((max(s.end or s.start for s in pages) - pages[0].start) * 1000, 1),
+                sum(s.attributes.get("available") or 0 for s in pages) if pages[0].status != "error" else None,
+                next((s.attributes.get("error") for s in pages if s.status == "error"), None),
+            ) for pages in availability_lookups(nested)]
+            rows = [(
+                a["resource_id"], a["start"], a["end"], tracer.wall_time(a["span"].start),
+                round(a["latency"] * 1000, 1), a["outcome"], a["error"],
+            ) for a in attempts]
+            self.pending.append((run, queries, rows))
+
+    def flush(self) -> bool:
+        if not self.pending:
+            return True
+        try:
+            with self._connect() as db:
+                for run, queries, attempts in self.pending:
+                    run_id = db.execute(
+                        "INSERT INTO runs (trace_id, account, trigger, release, started_at, fire_ms, first_booked_ms, "
+                        "slots, booked) VALUES (:trace_id, :account, :trigger, :release, :started_at, :fire_ms, "
+                        ":first_booked_ms, :slots, :booked)",
+                        run
+                    ).lastrowid
+                    db.executemany("INSERT INTO queries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(run_id, *q) for q in queries])
+                    db.executemany("INSERT INTO attempts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   [(run_id, *a) for a in attempts])
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not write run history: {e}")
+            return False
+        self.pending = []
+        return True
+
+    # --- analytics ----------------------------------------------------------
+
+    def runs(self, since: float, limit: int = None) -> list[sqlite3.Row]:
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            return db.execute(
+                "SELECT * FROM runs WHERE started_at >= ? ORDER BY started_at DESC LIMIT ?", (since, limit or -1)
+            ).fetchall()
+
+    def desk_stats(self, since: float = 0, account: str = None) -> dict[str, dict]:
+        """Attempts, bookings and median attempt latency per resource id."""
+        query = ("SELECT a.resource_id, a.outcome, a.latency_ms FROM attempts a JOIN runs r ON r.id = a.run_id "
+                 "WHERE r.started_at >= ?" + (" AND r.account = ?" if account else ""))
+        stats = {}
+        with self._connect() as db:
+            for resource_id, outcome, latency in db.execute(query, (since, account) if account else (since,)):
+                desk = stats.setdefault(resource_id, {"attempts": 0, "booked": 0, "latencies": []})
+                desk["attempts"] += 1
+                desk["booked"] += outcome == BOOKED
+                desk["latencies"].append(latency)
+        for desk in stats.values():
+            desk["median_ms"] = statistics.median(desk.pop("latencies"))
+        return stats
+
+    def sell_out(self, since: float) -> list[tuple]:
+        """
+        Per slot: the most and fewest desks any run found available, and the number of
+        attempts that failed (mostly because the desk had just been taken).
+        """
+        with self._connect() as db:
+            return db.execute("""
+                SELECT q.slot_start, q.slot_end, MAX(q.available), MIN(q.available),
+                       (SELECT COUNT(*) FROM attempts a WHERE a.slot_start = q.slot_start AND a.outcome = ?)
+                FROM queries q JOIN runs r ON r.id = q.run_id
+                WHERE r.started_at >= ? AND q.available IS NOT NULL
+                GROUP BY q.slot_start, q.slot_end ORDER BY q.slot_start DESC
+            """, (FAILED, since)).fetchall()
+
+
+def print_summary(history: RunHistory, since: float):
+    runs = history.runs(since)
+    if not runs:
+        print("No runs recorded yet")
+        return
+    by_day = {}
+    for run in runs:
+        day = datetime.datetime.fromtimestamp(run["started_at"]).date().isoformat()
+        by_day.setdefault(day, []).append(run)
+
+    print(f"{'day':<12}{'runs':>6}{'slots':>7}{'booked':>8}{'fire p50':>11}{'1st booking p50':>18}")
+    for day, day_runs in sorted(by_day.items(), reverse=True):
+        first_booked = [r["first_booked_ms"] for r in day_runs if r["first_booked_ms"] is not None]
+        first_booked = f"{statistics.median(first_booked):.0f} ms" if first_booked else "-"
+        print(f"{day:<12}{len(day_runs):>6}{sum(r['slots'] or 0 for r in day_runs):>7}"
+              f"{sum(r['booked'] for r in day_runs):>8}{statistics.median(r['fire_ms'] for r in day_runs):>8.0f} ms"
+              f"{first_booked:>18}")
+
+
+def print_desks(history: RunHistory, since: float, account: str = None):
+    stats = history.desk_stats(since, account)
+    if not stats:
+        print("No reserve attempts recorded yet")
+        return
+    print(f"{'resource':<12}{'attempts':>9}{'booked':>8}{'win rate':>10}{'median':>10}")
+    for resource_id, desk in sorted(stats.items(), key=lambda d: (-d[1]["booked"], -d[1]["attempts"])):
+        print(f"{resource_id:<12}{desk['attempts']:>9}{desk['booked']:>8}{desk['booked'] / desk['attempts']:>10.0%}"
+              f"{desk['median_ms']:>7.0f} ms")
+
+
+def print_runs(history: RunHistory, since: float, limit: int = 20):
+    for run in history.runs(since, limit):
+        started = datetime.datetime.fromtimestamp(run["started_at"]).isoformat(timespec="seconds")
+        print(f"{started}  {run['account'] or '-':<16} {run['trigger'] or '-':<9} "
+              f"{run['booked']}/{run['slots'] or 0} booked, fire phase {run['fire_ms']:.0f} ms")
+
+
+def print_slots(history: RunHistory, since: float):
+    rows = history.sell_out(since)
+    if not rows:
+        print("No availability queries recorded yet")
+        return
+    print(f"{'slot':<24}{'most free':>10}{'fewest free':>13}{'lost':>6}")
+    for start, end, most, fewest, lost in rows:
+        print(f"{start[:16].replace('T', ' ') + '-' + end[11:16]:<24}{most:>10}{fewest:>13}{lost:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="summary", choices=("summary", "desks", "runs", "slots"))
+    parser.add_argument("--days", type=float, default=30, help="Only look at the last DAYS days (default: 30)")
+    parser.add_argument("--account", help="Only look at this account (desks)")
+    parser.add_argument("--path", help="History database (default: RUN_HISTORY_PATH)")
+    args = parser.parse_args()
+
+    process = load_process_settings()
+    if not process:
+        return False
+    history = RunHistory(args.path or process.run_history_path)
+    since = (datetime.datetime.now() - datetime.timedelta(days=args.days)).timestamp()
+    if args.command == "desks":
+        print_desks(history, since, args.account)
+    elif args.command == "runs":
+        print_runs(history, since)
+    elif args.command == "slots":
+        print_slots(history, since)
+    else:
+        print_summary(history, since)
+    return True
+
+
+if __name__ == "__main__":
+    main()
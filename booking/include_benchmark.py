@@ -0,0 +1,114 @@
+"""
+Compare response size and time to first byte of the "lean" and "full" include profiles.
+
+Creates a pending order for the given resource with each profile and clears it
+again right away, so no booking is made. Run it outside the booking window:
+
+    python -m booking.include_benchmark --resource-id 5957 --rounds 5
+"""
+import argparse
+import statistics
+
+import requests
+
+from auth.cache import SessionCache
+from auth.session import AnnySession
+from booking.api import order_params, order_payload, parse_order
+from booking.client import BookingClient
+from config.settings import load_settings, load_process_settings
+from utils.helpers import get_future_datetime
+
+PROFILES = ("lean", "full")
+
+
+def measure(response: requests.Response) -> tuple[int, float]:
+    """Return (body bytes, seconds until the response headers arrived)."""
+    return len(response.content), response.elapsed.total_seconds()
+
+
+def run(booking: BookingClient, resource_id, start, end, rounds):
+    results = {(profile, step): [] for profile in PROFILES for step in ("order", "delete-all")}
+
+    for _ in range(rounds):
+        # Alternate profiles within a round so server load affects both alike
+        for profile in PROFILES:
+            created = booking.session.post(
+                f"{booking.settings.booking_api_base}/order/bookings",
+                params=order_params(profile=profile),
+                json=order_payload(resource_id, booking.service_id, start, end)
+            )
+            if not created.ok:
+                print(f"❌ Could not create order with profile {profile}: HTTP {created.status_code}")
+                return None
+            results[(profile, "order")].append(measure(created))
+
+            try:
+                order = parse_order(created.json())
+            except ValueError:
+                order = None
+            if not order:
+                print(f"❌ Order response with profile {profile} has no order id or access token")
+                return None
+
+            oid, oat = order
+            cleared = None
+            try:
+                cleared = booking.session.get(
+                    f"{booking.settings.booking_api_base}/order/bookings/delete-all",
+                    params=order_params(oid, oat, profile)
+                )
+            finally:
+                # Never leave a pending order holding the booking quota
+                if cleared is None or not cleared.ok:
+                    booking._clear_order(oid, oat)
+            if not cleared.ok:
+                print(f"❌ Could not clear order with profile {profile}: HTTP {cleared.status_code}")
+                return None
+            results[(profile, "delete-all")].append(measure(cleared))
+
+    return results
+
+
+def report(results):
+    print(f"{'request':<12}{'profile':<8}{'median bytes':>14}{'median TTFB':>14}")
+    for (profile, step), samples in sorted(results.items(), key=lambda item: (item[0][1], item[0][0])):
+        if not samples:
+            continue
+        size = statistics.median(s[0] for s in samples)
+        ttfb = statistics.median(s[1] for s in samples)
+        print(f"{step:<12}{profile:<8}{size:>14.0f}{ttfb * 1000:>11.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resource-id", required=True, help="A currently bookable resource id")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    settings, process = load_settings(), load_process_settings()
+    if not settings or not process:
+        return False
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    session = AnnySession(settings, cache=cache)
+    cookies = session.login()
+    if not cookies:
+        return False
+
+    booking = BookingClient(cookies, customer_account_id=session.customer_account_id, settings=settings,
+                            session=session.session)
+    if not booking.service_id and not booking.discover_resource_config():
+        return False
+
+    days_ahead = session.provider.available_days_ahead
+    slot = settings.booking_times[0]
+    start = get_future_datetime(days_ahead=days_ahead, time_string=slot['start'], timezone=settings.timezone)
+    end = get_future_datetime(days_ahead=days_ahead, time_string=slot['end'], timezone=settings.timezone)
+
+    results = run(booking, args.resource_id, start, end, args.rounds)
+    if results:
+        report(results)
+    return bool(results)
+
+
+if __name__ == "__main__":
+    main()
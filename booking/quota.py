@@ -0,0 +1,57 @@
+import datetime
+
+import pytz
+
+
+class BookingQuota:
+    """
+    Bookings the account holds per date, fetched once before a run and updated while
+    it books, checked against the booking limits before any order is created.
+
+    A date whose order or checkout was rejected for the booking limit counts as
+    exhausted for the rest of the run, whatever the configured limit says. Slots
+    overlapping a booking the account holds are never booked again, whatever the limits.
+    """
+
+    def __init__(self, per_day: int = 0, total: int = 0, timezone: str = "Europe/Berlin"):
+        self.per_day = per_day
+        self.total = total
+        self.timezone = timezone
+        self.by_date: dict[str, int] = {}
+        self.held: list[tuple[datetime.datetime, datetime.datetime]] = []
+        self.exhausted: set[str] = set()
+
+    def load(self, bookings: list[dict]):
+        """Count the account's bookings (as returned by BookingClient.fetch_bookings()) per local date."""
+        tz = pytz.timezone(self.timezone)
+        self.by_date, self.held = {}, []
+        for b in bookings:
+            if b["start"]:
+                start = datetime.datetime.fromisoformat(b["start"])
+                date = start.astimezone(tz).date().isoformat()
+                self.by_date[date] = self.by_date.get(date, 0) + 1
+                if b["end"]:
+                    self.held.append((start, datetime.datetime.fromisoformat(b["end"])))
+
+    @property
+    def booked(self) -> int:
+        return sum(self.by_date.values())
+
+    def holds(self, start: str, end: str) -> bool:
+        """Whether a booking the account holds overlaps the slot from `start` to `end` (ISO 8601)."""
+        start, end = datetime.datetime.fromisoformat(start), datetime.datetime.fromisoformat(end)
+        return any(held_start < end and start < held_end for held_start, held_end in self.held)
+
+    def allows(self, date: str) -> bool:
+        """Whether another booking on `date` (YYYY-MM-DD) stays within the limits."""
+        if date in self.exhausted:
+            return False
+        if self.per_day and self.by_date.get(date, 0) >= self.per_day:
+            return False
+        return not self.total or self.booked < self.total
+
+    def record_booking(self, date: str):
+        self.by_date[date] = self.by_date.get(date, 0) + 1
+
+    def record_limit_reached(self, date: str):
+        self.exhausted.add(date)
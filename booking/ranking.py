@@ -0,0 +1,71 @@
+import re
+from fnmatch import translate
+
+
+class ResourceRanker:
+    """
+    Orders the available resources of a slot by preference.
+
+    RESOURCE_IDS always come first, in the configured order. When any resource may
+    be booked, the others follow by resource group (the main room before the
+    fallback rooms) and within a group by score: the earlier the matching entry in
+    `areas` (parent resource ids) or `name_patterns` (case-insensitive globs like
+    "*window*"), the higher the score; every wanted feature found in the name or
+    description adds to it, and so does the resource's booking success rate (from the
+    run history of earlier runs, see seed(), and the attempts of this run).
+    Ties keep the order of the server response.
+    """
+
+    AREA_WEIGHT = 8
+    NAME_WEIGHT = 4
+    FEATURE_WEIGHT = 2
+    HISTORY_WEIGHT = 1
+
+    def __init__(self, resource_ids: list[str] = None, use_any: bool = False, areas: list[str] = None,
+                 name_patterns: list[str] = None, features: list[str] = None):
+        self.resource_ids = {r_id: i for i, r_id in enumerate(resource_ids or [])}
+        self.use_any = use_any
+        self.areas = {area: i for i, area in reversed(list(enumerate(areas or [])))}
+        self.name_patterns = [re.compile(translate(p.lower())) for p in name_patterns or []]
+        self.features = [f.lower() for f in features or []]
+        # resource id -> [successful bookings, attempts]
+        self.history: dict[str, list[int]] = {}
+
+    def score(self, resource: dict) -> float:
+        score = 0.0
+        if resource.get("parent_id") in self.areas:
+            score += self.AREA_WEIGHT * (1 - self.areas[resource["parent_id"]] / len(self.areas))
+
+        name = (resource.get("name") or "").lower()
+        for i, pattern in enumerate(self.name_patterns):
+            if pattern.match(name):
+                score += self.NAME_WEIGHT * (1 - i / len(self.name_patterns))
+                break
+
+        if self.features:
+            text = f"{name} {resource.get('description') or ''}".lower()
+            score += self.FEATURE_WEIGHT * sum(feature in text for feature in self.features)
+
+        successes, attempts = self.history.get(resource["id"], (0, 0))
+        # Resources without attempts rank like ones that succeed half of the time
+        return score + self.HISTORY_WEIGHT * (successes + 1) / (attempts + 2)
+
+    def rank(self, resources: list[dict]) -> list[str]:
+        """Ids of the resources worth trying, best first."""
+        preferred, others = [], []
+        for position, resource in enumerate(resources):
+            if resource["id"] in self.resource_ids:
+                preferred.append((self.resource_ids[resource["id"]], resource["id"]))
+            elif self.use_any:
+                others.append((resource.get("group", 0), -self.score(resource), position, resource["id"]))
+        return [r_id for *_, r_id in sorted(preferred) + sorted(others)]
+
+    def seed(self, stats: dict[str, dict]):
+        """Start the success rates from earlier runs, as returned by RunHistory.desk_stats()."""
+        self.history = {r_id: [desk["booked"], desk["attempts"]] for r_id, desk in stats.items()}
+
+    def record(self, resource_id: str, booked: bool):
+        """Count a booking attempt for the success rate."""
+        stats = self.history.setdefault(resource_id, [0, 0])
+        stats[0] += booked
+        stats[1] += 1
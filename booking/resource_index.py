@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from auth.cache import SessionCache
+from auth.session import AnnySession
+from booking.client import BookingClient
+from config.settings import load_settings, load_process_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to unlocked access
+    fcntl = None
+
+
+class ResourceIndex:
+    """
+    On-disk index of the bookable resources of a customer account: every parent
+    resource with its slug, services and child desks. One file can hold the
+    indexes of several accounts.
+
+    A fresh index lets discovery run without any request. The index expires after
+    `ttl` seconds and is rebuilt by paginating through all resources.
+
+    The instance holds no account's index, so runs of several accounts can share it
+    from parallel threads: load() and refresh() return it. Writes are serialized
+    with an advisory lock on a sidecar `.lock` file, like the session cache.
+    """
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+
+    def load(self, customer_account_id: str) -> dict | None:
+        """The account's index from disk, or None if it is missing or stale."""
+        with self._locked():
+            data = self._read().get(customer_account_id)
+        if not data or time.time() - data.get("built_at", 0) > self.ttl:
+            return None
+        return data
+
+    def refresh(self, booking) -> dict | None:
+        """Rebuild the account's index from the Anny API using a logged-in BookingClient, save and return it."""
+        print("ℹ️ Building resource index...")
+        pages = booking.fetch_all_resources()
+        if pages is None:
+            return None
+        resources, included = pages
+
+        service_names = {
+            i['id']: i.get('attributes', {}).get('name')
+            for i in included if i.get('type') == 'services'
+        }
+
+        parents = []
+        for r in resources:
+            attributes = r.get('attributes', {})
+            if not attributes.get('has_children'):
+                continue
+            slug = attributes.get('slug') or r['id']
+            svc_refs = r.get('relationships', {}).get('services', {}).get('data', [])
+            parents.append({
+                "id": r['id'],
+                "name": attributes.get('name'),
+                "slug": slug,
+                "path": f"/resources/{slug}",
+                "services": [{"id": s['id'], "name": service_names.get(s['id'])} for s in svc_refs],
+            })
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            children = list(pool.map(lambda p: booking.fetch_children(p["path"]), parents))
+
+        for parent, desks in zip(parents, children):
+            parent["desks"] = [
+                {"id": d['id'], "name": d.get('attributes', {}).get('name')}
+                for d in (desks or [])
+            ]
+
+        data = {
+            "customer_account_id": booking.customer_account_id,
+            "built_at": time.time(),
+            "resources": parents,
+        }
+        try:
+            self._save(data)
+        except OSError as e:
+            print(f"⚠️ Could not write resource index: {e}")
+        print(f"✅ Indexed {len(parents)} resources with {sum(len(p['desks']) for p in parents)} desks")
+        return data
+
+    @contextmanager
+    def _locked(self):
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, data: dict):
+        """Merge the account's index into the file, under the lock so parallel refreshes keep each other's entries."""
+        with self._locked():
+            accounts = self._read()
+            accounts[data["customer_account_id"]] = data
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".anny-index-")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(accounts, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    @staticmethod
+    def bookable(data: dict) -> list[tuple[str, str]]:
+        """(resource path, service id) for every resource of an account's index that has a service."""
+        return [(r["path"], r["services"][0]["id"]) for r in data["resources"] if r["services"]]
+
+    @staticmethod
+    def find_desks(data: dict, query: str) -> list[tuple[dict, dict]]:
+        """Return (resource, desk) pairs whose desk or resource name contains `query` (case-insensitive)."""
+        query = query.lower()
+        return [
+            (resource, desk)
+            for resource in data["resources"]
+            for desk in resource["desks"]
+            if query in (desk["name"] or "").lower() or query in (resource["name"] or "").lower()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and search the local index of bookable resources and desks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("refresh", help="Rebuild the index from the Anny API")
+    commands.add_parser("list", help="List all indexed resources and their services")
+    find = commands.add_parser("find", help="Look up desks by (part of) their name or their room's name")
+    find.add_argument("query")
+    args = parser.parse_args()
+
+    settings, process = load_settings(), load_process_settings()
+    if not settings or not process:
+        return False
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    session = AnnySession(settings, cache=cache)
+    if not session.login():
+        return False
+
+    booking = BookingClient(session.session.cookies, customer_account_id=session.customer_account_id, settings=settings,
+                            session=session.session)
+    index = ResourceIndex(process.resource_index_path, process.resource_index_ttl)
+
+    data = None if args.command == "refresh" else index.load(session.customer_account_id)
+    data = data or index.refresh(booking)
+    if not data:
+        return False
+
+    if args.command == "list":
+        for resource in data["resources"]:
+            services = ", ".join(f"{s['id']} ({s['name']})" for s in resource["services"]) or "-"
+            print(f"{resource['name']}: RESOURCE_URL_PATH={resource['path']}/children, SERVICE_ID={services}, "
+                  f"{len(resource['desks'])} desks")
+    elif args.command == "find":
+        matches = index.find_desks(data, args.query)
+        for resource, desk in matches:
+            print(f"{desk['id']:>8}  {desk['name']}  ({resource['name']}, RESOURCE_URL_PATH={resource['path']}/children)")
+        if not matches:
+            print(f"No desks matching '{args.query}'")
+    return True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from booking.api import error_summary
+
+# Outcomes of a single request
+OK = "ok"
+RETRYABLE = "retryable"   # rate limited, gateway errors, slot not bookable yet, network errors
+QUOTA = "quota"           # booking limit of the account reached - retrying won't help
+TAKEN = "taken"           # resource/slot no longer available - try another resource
+FAILED = "failed"         # anything else
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+# Refused before the request was processed; the only retryable statuses after which a POST may be repeated
+UNPROCESSED_STATUS = {429, 503}
+# Attempts kept for summary(), so a long-running client doesn't grow without limit
+MAX_ATTEMPTS_KEPT = 1000
+# Shortest timeout of a request, so one sent right at the deadline still gets a chance to be answered
+MIN_REQUEST_TIMEOUT = 1.0
+
+# Lower-case fragments of the errors[0] title/detail anny returns, by outcome
+NOT_YET_BOOKABLE_HINTS = ("not yet", "not bookable yet", "noch nicht", "too early", "zu früh")
+QUOTA_HINTS = ("limit", "quota", "maximum", "kontingent")
+TAKEN_HINTS = ("already booked", "not available", "unavailable", "no longer", "taken", "nicht verfügbar", "bereits")
+
+
+def classify(response: requests.Response | None) -> str:
+    """Classify a response (None for a network error) into one of the outcomes above."""
+    if response is None:
+        return RETRYABLE
+    if response.status_code < 400:
+        return OK
+    if response.status_code in RETRYABLE_STATUS:
+        return RETRYABLE
+
+    try:
+        message = (error_summary(response.json()) or "").lower()
+    except ValueError:
+        message = ""
+
+    if any(hint in message for hint in NOT_YET_BOOKABLE_HINTS):
+        return RETRYABLE
+    if any(hint in message for hint in QUOTA_HINTS):
+        return QUOTA
+    if response.status_code == 409 or any(hint in message for hint in TAKEN_HINTS):
+        return TAKEN
+    return FAILED
+
+
+def unsent(error: Exception) -> bool:
+    """Whether a network error happened while connecting, i.e. before the request was sent."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def outcome_unknown(response: requests.Response | None) -> bool:
+    """
+    Whether a request may have been processed although no answer says so: no response
+    at all, or a gateway error (502, 504) from a proxy that may have passed it on.
+    """
+    return response is None or response.status_code in RETRYABLE_STATUS - UNPROCESSED_STATUS
+
+
+def retry_after(response: requests.Response | None) -> float | None:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), if any."""
+    value = response.headers.get('retry-after') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class Attempt:
+    name: str
+    number: int
+    latency: float
+    status_code: int | None
+    outcome: str
+
+
+class RetryPolicy:
+    """
+    Retries a request while its outcome is RETRYABLE, with full-jitter exponential
+    backoff (or the server's Retry-After), until a deadline runs out.
+
+    Every attempt is recorded in `attempts` with its latency and outcome (the last
+    MAX_ATTEMPTS_KEPT of them).
+    """
+
+    def __init__(self, budget: float = 10.0, base_delay: float = 0.1, max_delay: float = 2.0):
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts: deque[Attempt] = deque(maxlen=MAX_ATTEMPTS_KEPT)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.attempts = deque(maxlen=MAX_ATTEMPTS_KEPT)
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, name: str, send, deadline: float = None, idempotent: bool = True) -> requests.Response:
+        """
+        Call `send(timeout)` (which performs one request with that timeout and returns its
+        response) until the outcome is no longer RETRYABLE or `deadline` (monotonic,
+        default: now + budget) would be exceeded. The timeout is the time left until the
+        deadline (at least MIN_REQUEST_TIMEOUT), so a stalled connection can't outlast it.
+        Returns the last response; re-raises the last network error if no response was
+        received at all.
+
+        A request that is not `idempotent` (creating an order, checking out) is only
+        repeated if the first one cannot have been processed: refused with 429/503 or
+        "not bookable yet", or failed while connecting. Otherwise the response (or
+        network error) whose outcome_unknown() is returned (raised) right away.
+        """
+        deadline = deadline or time.monotonic() + self.budget
+        number = 0
+        while True:
+            number += 1
+            started = time.monotonic()
+            error = None
+            try:
+                response = send(max(deadline - time.monotonic(), MIN_REQUEST_TIMEOUT))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+
+            outcome = classify(response)
+            with self._lock:
+                self.attempts.append(Attempt(
+                    name, number, time.monotonic() - started,
+                    response.status_code if response is not None else None, outcome
+                ))
+
+            if outcome != RETRYABLE:
+                return response
+            if not idempotent and (not unsent(error) if error else outcome_unknown(response)):
+                if error:
+                    raise error
+                return response
+
+            delay = retry_after(response)
+            if delay is None:
+                delay = self.backoff(number)
+            if time.monotonic() + delay >= deadline:
+                if error:
+                    raise error
+                return response
+
+            time.sleep(delay)
+
+    def summary(self) -> str:
+        with self._lock:
+            attempts = list(self.attempts)
+        retries = sum(1 for a in attempts if a.number > 1)
+        outcomes = {}
+        for a in attempts:
+            outcomes[a.outcome] = outcomes.get(a.outcome, 0) + 1
+        latencies = sorted(a.latency for a in attempts)
+        median = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        by_outcome = ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))
+        return f"{len(attempts)} requests ({retries} retries; {by_outcome}), median latency {median:.0f} ms"
@@ -0,0 +1,400 @@
+import datetime
+import sqlite3
+import time
+
+from auth.cache import SessionCache, jwt_expiry
+from auth.session import AnnySession
+from booking.api import complete_customer
+from booking.claims import DeskClaims, RELEASE_WAIT_SECONDS, RELEASE_POLL_SECONDS
+from booking.client import BookingClient, CheckoutException
+from booking.history import RunHistory
+from booking.quota import BookingQuota
+from booking.ranking import ResourceRanker
+from booking.resource_index import ResourceIndex
+from config.settings import Settings, ProcessSettings
+from utils.clock import ClockCalibrator, ClockEstimate
+from utils.helpers import get_future_datetime, parse_weekdays
+from utils.tracing import tracer
+
+# Only wait for midnight if it is at most this far away, otherwise execute immediately
+MAX_WAIT_SECONDS = 10 * 60
+# Runs of the run history the desk success rates of the ranking are taken from
+RANKING_HISTORY_DAYS = 30
+
+
+def next_release_at(tz, release_time: str = "00:00:00", now: datetime.datetime = None) -> datetime.datetime:
+    """Return the next occurrence of the local time `release_time` (hh:mm:ss) after `now`."""
+    now = now or datetime.datetime.now(tz)
+    hour, minute, second = map(int, release_time.split(":"))
+    release = tz.localize(datetime.datetime.combine(now.date(), datetime.time(hour, minute, second)))
+    if release <= now:
+        release = tz.localize(datetime.datetime.combine(now.date() + datetime.timedelta(days=1),
+                                                        datetime.time(hour, minute, second)))
+    return release
+
+
+def monotonic_deadline(release: datetime.datetime) -> float:
+    """Convert an aware datetime into a time.monotonic() deadline."""
+    return time.monotonic() + (release - datetime.datetime.now(release.tzinfo)).total_seconds()
+
+
+def next_release(tz):
+    """
+    Return (release instant, monotonic deadline) for the upcoming midnight if it is
+    within MAX_WAIT_SECONDS, otherwise (now, None) to execute immediately.
+    """
+    now = datetime.datetime.now(tz)
+    midnight = next_release_at(tz, now=now)
+    seconds_until_midnight = (midnight - now).total_seconds()
+
+    if 0 < seconds_until_midnight <= MAX_WAIT_SECONDS:
+        return midnight, time.monotonic() + seconds_until_midnight
+
+    print(f"⚡ More than 10 min until midnight, executing immediately...")
+    return now, None
+
+
+def calibrate_deadline(booking: BookingClient, deadline: float, process: ProcessSettings) -> float:
+    """Shift the deadline so the first request reaches the server just after *its* midnight."""
+    clock = ClockEstimate()
+    if process.clock_calibration:
+        with tracer.span("clock_calibration"):
+            clock = ClockCalibrator(booking.session, booking.settings.booking_api_base,
+                                    samples=process.clock_samples).calibrate()
+        print(f"ℹ️ Server clock offset {clock.offset * 1000:+.1f} ms "
+              f"(±{clock.uncertainty * 1000:.1f} ms), RTT {clock.rtt * 1000:.1f} ms, {clock.samples} samples")
+    return deadline + clock.fire_delay(process.fire_margin_ms / 1000)
+
+
+def report_fire_error(booking: BookingClient, deadline: float, process: ProcessSettings):
+    if booking.adapter.first_sent_at is None:
+        return
+    fire_error_ms = (booking.adapter.first_sent_at - deadline) * 1000
+    print(f"ℹ️ First request was sent {fire_error_ms:+.1f} ms from the fire deadline "
+          f"(expected arrival {process.fire_margin_ms + fire_error_ms:+.1f} ms after server midnight)")
+
+
+def write_trace(process: ProcessSettings, release: datetime.datetime = None, trigger: str = None):
+    """
+    Print the critical path of every fire phase, write/export the trace if configured
+    and add the run to the run history.
+    """
+    tracer.print_summary()
+    if process.use_run_history:
+        history = RunHistory(process.run_history_path)
+        history.add_trace(tracer, release, trigger)
+        history.flush()
+    if process.trace_report_path:
+        try:
+            tracer.save(process.trace_report_path, process.trace_report_format)
+            print(f"ℹ️ Run report written to {process.trace_report_path}")
+        except OSError as e:
+            print(f"⚠️ Could not write run report: {e}")
+    if process.trace_otlp_endpoint:
+        tracer.export_otlp(process.trace_otlp_endpoint)
+
+
+def plan_days(booking_days: str, horizon: int, base: datetime.datetime) -> list[int]:
+    """
+    Days ahead of `base` to book for: "release" only books the day that has just become
+    bookable (`horizon` days ahead), "all" every day from `base` through the horizon, and
+    a weekday pattern like "mon-fri" the days of the horizon on those weekdays.
+    The newly released day always comes first, since it is the one others compete for.
+    """
+    if booking_days == "release":
+        days = [horizon]
+    elif booking_days == "all":
+        days = list(range(horizon + 1))
+    else:
+        weekdays = parse_weekdays(booking_days)
+        days = [d for d in range(horizon + 1) if (base + datetime.timedelta(days=d)).weekday() in weekdays]
+    return sorted(days, key=lambda d: (d != horizon, d))
+
+
+class BookingRun:
+    """
+    Login, discovery and booking for one account.
+
+    The account's configuration comes from its Settings and all per-account state
+    (slots, quota, ranking, sessions) lives on the instance, so many runs can be
+    armed and fired from one process.
+    """
+
+    def __init__(self, settings: Settings, cache: SessionCache = None, index: ResourceIndex = None,
+                 claims: DeskClaims = None, run_history: RunHistory = None):
+        self.settings = settings
+        self.username = settings.username
+        self.booking_times = settings.booking_times
+        self.resource_ids = settings.resource_ids
+        self.use_any_resource_id = settings.use_any_resource_id
+        self.booking_days = settings.booking_days
+        self.cache = cache
+        self.index = index
+        self.claims = claims
+        self.run_history = run_history
+
+        self.session = AnnySession(settings, cache=cache)
+        self.booking: BookingClient = None
+        self.customer = None  # checkout customer profile, kept across logins and runs
+        self.slots = []
+        self.quota = self._quota()
+        self.ranker = ResourceRanker(settings.resource_ids, settings.use_any_resource_id, settings.preferred_areas,
+                                     settings.preferred_names, settings.preferred_features)
+
+    def _quota(self) -> BookingQuota:
+        return BookingQuota(self.settings.booking_limit_per_day, self.settings.booking_limit_total,
+                            self.settings.timezone)
+
+    def arm(self) -> bool:
+        """Log in and discover the resource configuration. Returns False on failure."""
+        with tracer.span("arm", account=self.username):
+            cookies = self.session.login()
+            if not cookies:
+                return False
+
+            self.booking = self._client(cookies)
+
+            if self.session.from_cache and not self.booking.check_auth():
+                print("⚠️ Cached session was rejected, logging in again...")
+                self.session.invalidate_cache()
+                cookies = self.session.login(use_cache=False)
+                if not cookies:
+                    return False
+                self.booking = self._client(cookies)
+
+            if self.cache:
+                stats = self.cache.stats()
+                print(f"ℹ️ Session cache: {stats.get('hits', 0)} hits, {stats.get('misses', 0)} misses")
+
+            if not self.booking.groups:
+                print("ℹ️ RESOURCE_URL_PATH or SERVICE_ID not set — attempting auto-discovery...")
+                if not self.booking.discover_resource_config(index=self.index):
+                    print("❌ Auto-discovery failed. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
+                    return False
+
+            # With the customer profile of an earlier run, finalize needs no checkout form
+            cached = self.session.cached_customer()
+            self.booking.customer = self.customer or (cached if complete_customer(cached) else None)
+            return True
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.booking and self.booking.groups)
+
+    def token_expires_at(self) -> float | None:
+        """Unix time the anny token of the logged-in session expires at, if known."""
+        return jwt_expiry(self.booking.token) if self.booking and self.booking.token else None
+
+    def refresh(self) -> bool:
+        """Log in again with a fresh SSO flow, keeping the discovered resource configuration."""
+        if not self.booking:
+            return self.arm()
+        with tracer.span("refresh", account=self.username):
+            session = AnnySession(self.settings, cache=self.cache)
+            cookies = session.login(use_cache=False)
+            if not cookies:
+                return False
+
+            groups, customer = self.booking.groups, self.booking.customer
+            self.session = session
+            self.booking = self._client(cookies)
+            self.booking.groups, self.booking.customer = groups, customer
+            return True
+
+    def _client(self, cookies) -> BookingClient:
+        return BookingClient(cookies, customer_account_id=self.session.customer_account_id, settings=self.settings,
+                             session=self.session.session)
+
+    def plan(self, release: datetime.datetime):
+        """
+        Compute every (date, slot) pair relative to the release instant before waiting,
+        so nothing but booking requests is left to do after midnight. The account's
+        bookings are fetched once; slots overlapping one of them and dates on which
+        the booking limit is already reached are skipped. With a run history, the
+        ranking starts from the account's success rate per desk in recent runs.
+        """
+        self.quota = self._quota()
+        if self.claims:
+            self.claims.join(release.timestamp())
+        if self.run_history:
+            self._seed_ranking()
+        bookings = self.booking.fetch_bookings()
+        if bookings is None:
+            print("⚠️ Could not fetch existing bookings, booking every planned date")
+        else:
+            self.quota.load(bookings)
+
+        horizon = self.session.provider.available_days_ahead
+        self.slots, skipped = [], set()
+        for days_ahead in plan_days(self.booking_days, horizon, release):
+            for time_ in self.booking_times:
+                start = get_future_datetime(days_ahead, time_['start'], release, self.settings.timezone)
+                end = get_future_datetime(days_ahead, time_['end'], release, self.settings.timezone)
+                if datetime.datetime.fromisoformat(start) < release:
+                    continue
+                if self.quota.holds(start, end):
+                    print(f"ℹ️ Skipping {start[:10]} {time_['start']}-{time_['end']}, already booked")
+                elif not self.quota.allows(start[:10]):
+                    skipped.add(start[:10])
+                else:
+                    self.slots.append((time_, start, end))
+
+        for date in sorted(skipped):
+            print(f"ℹ️ Skipping {date}, booking limit reached ({self.quota.by_date.get(date, 0)} booked that day, "
+                  f"{self.quota.booked} in total)")
+
+    def _seed_ranking(self):
+        """Rank desks by how often this account booked them in recent runs."""
+        since = time.time() - RANKING_HISTORY_DAYS * 24 * 3600
+        try:
+            self.ranker.seed(self.run_history.desk_stats(since, self.username))
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not read run history: {e}")
+
+    def fire(self) -> dict[str, str | None]:
+        """
+        Look up every slot at once, then book them in priority order. Booking starts
+        on the first page of availability while later pages are still loading.
+        Returns the booked resource id (or None) for each "date start-end" slot.
+        """
+        with tracer.span("fire", account=self.username, slots=len(self.slots)):
+            booking = self.booking
+            results = {f"{start[:10]} {time_['start']}-{time_['end']}": None for time_, start, _ in self.slots}
+            availability = booking.find_available_resources_many([(start, end) for _, start, end in self.slots],
+                                                                 stream=True)
+            if self.claims:
+                # Read while the availability lookups are on their way
+                bookers = self.claims.load_bookers()
+                print(f"ℹ️ Desk claims: {len(bookers)} bookers, desks assigned to "
+                      f"{self.claims.booker} are tried first")
+
+            for time_, start, end in self.slots:
+                label = f"{start[:10]} {time_['start']}-{time_['end']}"
+                date = start[:10]
+                if not self.quota.allows(date):
+                    print(f"ℹ️ Skipping {label}, booking limit reached")
+                    continue
+
+                # All attempts for this slot share one retry budget
+                deadline = time.monotonic() + self.settings.retry_budget_seconds
+                try:
+                    stream = availability[(start, end)]
+
+                    if stream is None:
+                        print(f"⚠️ Could not fetch available resources for {label}, skipping...")
+                        continue
+
+                    if self.settings.reserve_strategy == "race":
+                        try:
+                            # Race the pages that have arrived, then the ones arriving later
+                            while not results[label] and (resources := stream.take(wait=True)) is not None:
+                                if resources:
+                                    results[label] = self._race(self._order(self.ranker.rank(resources)),
+                                                                start, end, deadline)
+                            if results[label]:
+                                self.ranker.record(results[label], True)
+                                self.quota.record_booking(date)
+                            else:
+                                print(f"⚠️ No available slots found for {label}")
+                        except CheckoutException:
+                            print(f"⚠️ You have probably exceeded your booking limit for {label}")
+                            self.quota.record_limit_reached(date)
+                        continue
+
+                    # Iterate through resource ids until booking is successful
+                    held = set()
+                    for i, r_id in enumerate(self._ranked(stream, start, held)):
+                        try:
+                            success = booking.reserve(r_id, start, end, deadline=deadline)
+                            self.ranker.record(r_id, success)
+                        except CheckoutException:
+                            # Reservation failed on checkout -> Booking limit exceeded for that timeslot -> try next booking time
+                            print(f"⚠️ You have probably exceeded your booking limit for {label}")
+                            self.quota.record_limit_reached(date)
+                            break
+
+                        if success:
+                            results[label] = r_id
+                            self.quota.record_booking(date)
+                            break
+
+                        print(f"  Attempt {i + 1}")
+                    else:
+                        print(f"⚠️ No available slots found for {label}")
+                    if held:
+                        # Desks claimed in a batch but not booked are left to the other bookers
+                        self.claims.release(start, [r_id for r_id in held if r_id != results[label]])
+                except Exception as e:
+                    print(f"❌ Error booking slot {label}: {e}")
+                    break
+
+        print(f"ℹ️ {booking.retry.summary()}")
+        if self.claims and self.claims.skipped:
+            print(f"ℹ️ Skipped {len(self.claims.skipped)} desks claimed by other bookers")
+        if complete_customer(booking.customer) and booking.customer != self.customer:
+            self.customer = booking.customer
+            self.session.store_customer(booking.customer)
+        return results
+
+    def _ranked(self, stream, slot_start: str = None, held: set = None):
+        """
+        Resource ids of a streamed availability lookup, best first. Pages that arrive
+        while a desk is being tried are ranked in with the untried ones before the next
+        attempt; waits for a page only when nothing is left to try.
+        With desk claims, only desks this account holds are yielded; they are added to `held`.
+        """
+        untried = {}
+        while (resources := stream.take(wait=not untried)) is not None or untried:
+            untried.update((r["id"], r) for r in resources or [])
+            ranked = self._order(self.ranker.rank(list(untried.values())))
+            if self.claims:
+                ranked = self._claim_ranked(slot_start, ranked, held)
+            untried = {r_id: untried[r_id] for r_id in ranked[1:]}
+            if ranked:
+                yield ranked[0]
+
+    def _claim_ranked(self, slot_start: str, ranked: list[str], held: set) -> list[str]:
+        """
+        Claim the desks of `ranked` assigned to this account in one batch, as they arrive,
+        and the desks of other bookers only once they come first. Returns `ranked` without
+        the desks claimed by other bookers, starting with one this account holds.
+        """
+        while ranked and ranked[0] not in held:
+            wanted = [r_id for r_id in ranked if r_id not in held
+                      and (r_id == ranked[0] or self.claims.owner(r_id) == self.claims.booker)]
+            held.update(self.claims.claim(slot_start, wanted))
+            ranked = [r_id for r_id in ranked if r_id in held or r_id not in wanted]
+        return ranked
+
+    def _order(self, resource_ids: list[str]) -> list[str]:
+        """With desk claims, the desks assigned to this account come first."""
+        return self.claims.order(resource_ids) if self.claims else resource_ids
+
+    def _race(self, resource_ids: list[str], start: str, end: str, deadline: float) -> str | None:
+        """
+        reserve_race() over the desks this account could claim, race_fan_out at a time.
+        The other desks of a won race are released again, since their orders were
+        cleared; desks claimed by others are polled for a little while in case they are.
+        """
+        fan_out = self.settings.race_fan_out
+        if not self.claims:
+            return self.booking.reserve_race(resource_ids, start, end, fan_out=fan_out, deadline=deadline)
+        wait_until = min(time.monotonic() + RELEASE_WAIT_SECONDS, deadline)
+        while resource_ids:
+            remaining, skipped = list(resource_ids), []
+            while remaining:
+                batch = []
+                while remaining and len(batch) < fan_out:
+                    wanted, remaining = remaining[:fan_out - len(batch)], remaining[fan_out - len(batch):]
+                    held = self.claims.claim(start, wanted)
+                    batch += held
+                    skipped += [r_id for r_id in wanted if r_id not in held]
+                if batch and (booked := self.booking.reserve_race(batch, start, end, fan_out=fan_out,
+                                                                   deadline=deadline)):
+                    self.claims.release(start, [r_id for r_id in batch if r_id != booked])
+                    return booked
+            if time.monotonic() >= wait_until:
+                break
+            time.sleep(RELEASE_POLL_SECONDS)
+            resource_ids = skipped
+        return None
@@ -0,0 +1,182 @@
+import datetime
+import hashlib
+import random
+import time
+from dataclasses import dataclass, field
+
+import requests
+
+from auth.cache import SessionCache
+from booking.client import CheckoutException
+from booking.resource_index import ResourceIndex
+from booking.retry import retry_after
+from booking.runner import BookingRun
+from config.settings import load_settings, load_process_settings
+from utils.helpers import get_future_datetime
+from utils.tracing import tracer
+
+
+@dataclass
+class WatchedSlot:
+    label: str
+    start: str
+    end: str
+    etag: str = None
+    digest: str = None                              # hash of the last available resource ids (all pages)
+    available: set = field(default_factory=set)     # ids of the resources available in the last response
+    attempted: set = field(default_factory=set)     # ids tried since they last became available
+    booked: str = None                              # resource id booked for this slot
+    stopped: str = None                             # why the slot is no longer watched
+
+
+class AvailabilityWatcher:
+    """
+    Polls availability of a set of slots and books a resource as soon as a wanted one
+    is freed (e.g. by a cancellation).
+
+    The poll interval adapts: it starts at `min_interval`, grows by half after every
+    round without changes up to `max_interval`, drops back to `min_interval` when the
+    availability changed and backs off on rate limiting. Responses are compared by
+    ETag (If-None-Match) or a hash of the available ids, and a resource is only tried once until it
+    disappears and shows up again.
+    """
+
+    def __init__(self, run: BookingRun, slots: list[WatchedSlot], min_interval: float = 20, max_interval: float = 300):
+        self.run = run
+        self.slots = slots
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.requests = 0
+
+    @property
+    def watching(self) -> list[WatchedSlot]:
+        return [slot for slot in self.slots if not slot.booked and not slot.stopped]
+
+    def watch(self, until: float = None):
+        """Poll until every slot is booked or given up, or until the monotonic time `until`."""
+        print(f"👀 Watching {len(self.watching)} slots...")
+        while self.watching and (until is None or time.monotonic() < until):
+            delay = self.poll_round()
+            tracer.reset()
+            if self.watching:
+                time.sleep(delay * random.uniform(0.9, 1.1))
+
+        booked = [slot for slot in self.slots if slot.booked]
+        print(f"🏁 Watcher stopped after {self.requests} requests, {len(booked)} slots booked")
+        return booked
+
+    def poll_round(self) -> float:
+        """Poll every watched slot once. Returns the delay before the next round."""
+        changed, throttle, failed = False, None, False
+        now = datetime.datetime.now(self.run.settings.tz)
+        # Attempts are only summarized per run; the watcher runs all day
+        self.run.booking.retry.reset()
+        for slot in self.watching:
+            if datetime.datetime.fromisoformat(slot.start) <= now:
+                slot.stopped = "started"
+                continue
+
+            self.requests += 1
+            try:
+                response, resources = self.run.booking.poll_available_resources(slot.start, slot.end, slot.etag)
+            except requests.RequestException as e:
+                print(f"⚠️ Availability poll for {slot.label} failed ({type(e).__name__})")
+                failed = True
+                continue
+
+            if response.status_code in (401, 403):
+                print("♻️ Session expired, logging in again...")
+                if not self.run.refresh():
+                    return self.max_interval
+                continue
+            if response.status_code == 429:
+                throttle = retry_after(response) or self.interval * 2
+                break
+            if resources is None:
+                continue
+
+            slot.etag = response.headers.get('etag')
+            digest = hashlib.sha1(",".join(sorted(r["id"] for r in resources)).encode()).hexdigest()
+            if digest == slot.digest:
+                continue
+            slot.digest = digest
+
+            available = {r["id"] for r in resources}
+            # Resources that went away may be tried again when they come back
+            slot.attempted &= available
+            changed |= available != slot.available
+            slot.available = available
+            self._book(slot, resources)
+
+        if throttle:
+            self.interval = min(max(throttle, self.interval * 2), self.max_interval)
+            print(f"⚠️ Rate limited, next poll in {self.interval:.0f} s")
+        elif failed:
+            # Counts as unchanged, and backs off faster while the network or anny is down
+            self.interval = min(self.interval * 2, self.max_interval)
+        elif changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        return self.interval
+
+    def _book(self, slot: WatchedSlot, resources: list[dict]):
+        for r_id in self.run.ranker.rank(resources):
+            if r_id in slot.attempted:
+                continue
+            slot.attempted.add(r_id)
+            print(f"🔔 Resource {r_id} is free for {slot.label}, booking...")
+            try:
+                booked = self.run.booking.reserve(r_id, slot.start, slot.end)
+                self.run.ranker.record(r_id, booked)
+                if booked:
+                    slot.booked = r_id
+                    return
+            except requests.RequestException as e:
+                print(f"⚠️ Booking resource {r_id} failed ({type(e).__name__})")
+            except CheckoutException:
+                print(f"⚠️ You have probably exceeded your booking limit for {slot.label}, no longer watching it")
+                slot.stopped = "quota"
+                return
+
+
+def watch_slots(booking_times: list[dict], days_ahead: list[int], timezone: str = "Europe/Berlin") -> list[WatchedSlot]:
+    """One slot per day in `days_ahead` and booking time, in priority order of the days."""
+    slots = []
+    for day in days_ahead:
+        for time_ in booking_times:
+            start = get_future_datetime(days_ahead=day, time_string=time_['start'], timezone=timezone)
+            end = get_future_datetime(days_ahead=day, time_string=time_['end'], timezone=timezone)
+            slots.append(WatchedSlot(f"{start[:10]} {time_['start']}-{time_['end']}", start, end))
+    return slots
+
+
+def main():
+    settings, process = load_settings(), load_process_settings()
+    if not settings or not process:
+        return False
+    if not settings.username or not settings.password:
+        print("❌ Missing USERNAME or PASSWORD in .env")
+        return False
+
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    index = ResourceIndex(process.resource_index_path, process.resource_index_ttl) if process.use_resource_index else None
+    run = BookingRun(settings, cache=cache, index=index)
+    if not run.resource_ids and not run.use_any_resource_id:
+        print("❌ Set RESOURCE_IDS or USE_ANY_RESOURCE_ID to choose which resources to book")
+        return False
+    if not run.arm():
+        return False
+
+    days_ahead = process.watch_days_ahead or list(range(run.session.provider.available_days_ahead + 1))
+    watcher = AvailabilityWatcher(run, watch_slots(settings.booking_times, days_ahead, settings.timezone),
+                                  process.watch_min_interval_seconds, process.watch_max_interval_seconds)
+    try:
+        return bool(watcher.watch())
+    except KeyboardInterrupt:
+        return False
+
+
+if __name__ == "__main__":
+    main()
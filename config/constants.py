@@ -1,33 +0,0 @@
-from os import getenv
-from dotenv import load_dotenv
-
-AUTH_BASE_URL = "https://auth.anny.eu"
-ANNY_BASE_URL = "https://anny.eu"
-BOOKING_API_BASE = "https://b.anny.eu/api/v1"
-CHECKOUT_FORM_API = "https://b.anny.eu/api/ui/checkout-form"
-
-DEFAULT_HEADERS = {
-    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:140.0) Gecko/20100101 Firefox/140.0',
-    'accept-encoding': 'plain'
-}
-
-# Get variables from dotenv file
-load_dotenv('.env', override=True)
-
-USERNAME = getenv("USERNAME")
-PASSWORD = getenv("PASSWORD")
-
-TIMEZONE = getenv("TIMEZONE") or "Europe/Berlin"
-
-## Provider - available: kit, tum (add more in auth/providers/)
-SSO_PROVIDER = getenv("SSO_PROVIDER") or "kit"
-RESOURCE_URL_PATH = getenv("RESOURCE_URL_PATH")
-SERVICE_ID = getenv("SERVICE_ID")
-RESOURCE_IDS = [i.strip() for i in getenv("RESOURCE_IDS").split(",")] if getenv("RESOURCE_IDS") else None
-USE_ANY_RESOURCE_ID = getenv("USE_ANY_RESOURCE_ID") == "True"
-
-RESOURCE_URL = f"{BOOKING_API_BASE}{RESOURCE_URL_PATH}" if RESOURCE_URL_PATH else None
-
-# Booking time slots (in order of priority)
-BOOKING_TIMES_CSV = getenv("BOOKING_TIMES") or "14:00:00-19:00:00, 09:00:00-13:00:00, 20:00:00-23:45:00"
-BOOKING_TIMES = [{"start": b.split("-")[0].strip(), "end": b.split("-")[1].strip()} for b in BOOKING_TIMES_CSV.split(",")]
\ No newline at end of file
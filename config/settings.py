@@ -0,0 +1,290 @@
+import dataclasses
+import json
+import os
+import typing
+from dataclasses import dataclass, field
+
+from utils.helpers import parse_csv, parse_int_csv, parse_booking_times, parse_resource_groups, parse_weekdays
+
+DEFAULT_HEADERS = {
+    'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:140.0) Gecko/20100101 Firefox/140.0',
+    'accept-encoding': 'plain'
+}
+
+DEFAULT_BOOKING_TIMES = "14:00:00-19:00:00, 09:00:00-13:00:00, 20:00:00-23:45:00"
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ("true", "1", "yes", "on"):
+        return True
+    if str(value).strip().lower() in ("false", "0", "no", "off"):
+        return False
+    raise ValueError(f"expected True or False, got {value!r}")
+
+
+def _has_type(value, expected) -> bool:
+    """Whether a value that is not parsed (i.e. not a string, e.g. from JSON) has the field's type."""
+    expected = typing.get_origin(expected) or expected
+    if expected is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, expected)
+
+
+# Parsers that also take the value as a JSON list
+LIST_PARSERS = (parse_csv, parse_int_csv, parse_booking_times, parse_resource_groups)
+
+
+def _setting(default=None, env=None, parse=str):
+    """A settings field read from the environment variable `env` (default: the upper-cased field name)."""
+    metadata = {"env": env, "parse": parse}
+    if isinstance(default, list):
+        return field(default_factory=lambda: list(default), metadata=metadata)
+    return field(default=default, metadata=metadata)
+
+
+class _EnvSettings:
+    """Loading shared by Settings and ProcessSettings, whose fields are declared with _setting()."""
+
+    @staticmethod
+    def env_name(f: dataclasses.Field) -> str:
+        return f.metadata["env"] or f.name.upper()
+
+    @classmethod
+    def from_dict(cls, values: dict, base=None):
+        """
+        Build settings from `values`, keyed by field name or environment variable name.
+        Strings are parsed like environment variables, other values (e.g. from JSON) must
+        have the field's type; empty values keep the default (or the value of `base`).
+        """
+        fields = {}
+        for f in dataclasses.fields(cls):
+            fields[f.name] = fields[cls.env_name(f).lower()] = f
+
+        changes = {}
+        for key, value in values.items():
+            f = fields.get(key.lower())
+            if f is None:
+                raise ConfigError(f"Unknown setting: {key}")
+            if value is None or value == "":
+                continue
+            parse = f.metadata["parse"]
+            if isinstance(value, str) or (parse in LIST_PARSERS and isinstance(value, (list, tuple))):
+                try:
+                    value = parse(value.strip() if isinstance(value, str) else value)
+                except (ValueError, KeyError, TypeError) as e:
+                    raise ConfigError(f"{cls.env_name(f)}: invalid value {value!r} ({e})") from None
+            elif not _has_type(value, f.type):
+                expected = (typing.get_origin(f.type) or f.type).__name__
+                raise ConfigError(f"{cls.env_name(f)}: expected {expected}, got {value!r}")
+            elif f.type is float:
+                value = float(value)
+            changes[f.name] = value
+        return dataclasses.replace(base, **changes) if base else cls(**changes)
+
+    @classmethod
+    def from_env(cls, environ: dict = None, env_file: str = ".env"):
+        """
+        Read the settings from environment variables (default: os.environ), overridden
+        by `env_file` if it exists, like `load_dotenv(env_file, override=True)`.
+        """
+        values = dict(os.environ if environ is None else environ)
+        if env_file and os.path.exists(env_file):
+            from dotenv import dotenv_values
+            values.update({k: v for k, v in dotenv_values(env_file).items() if v is not None})
+
+        names = {cls.env_name(f) for f in dataclasses.fields(cls)}
+        return cls.from_dict({k: v for k, v in values.items() if k in names})
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Read the settings from a JSON object or a .env file (without the process environment)."""
+        if path.endswith(".json"):
+            try:
+                with open(path) as f:
+                    values = json.load(f)
+            except ValueError as e:
+                raise ConfigError(f"{path}: {e}") from None
+            if not isinstance(values, dict):
+                raise ConfigError(f"{path}: expected a JSON object")
+            return cls.from_dict(values)
+        return cls.from_env(environ={}, env_file=path)
+
+    def replace(self, **changes):
+        """A copy with some fields changed (validated like a new instance)."""
+        return dataclasses.replace(self, **changes)
+
+
+@dataclass(frozen=True)
+class Settings(_EnvSettings):
+    """
+    Configuration of one account: credentials, what to book and the endpoints and
+    client tuning to book it with. Passed to AnnySession, BookingClient and BookingRun,
+    so one process can hold the settings of many accounts.
+
+    Building it validates every value and raises ConfigError on malformed ones.
+    Importing this module reads nothing; use from_env(), from_file() or from_dict().
+    """
+
+    username: str = _setting()
+    password: str = _setting()
+    sso_provider: str = _setting("kit", parse=str.lower)
+    timezone: str = _setting("Europe/Berlin")
+
+    booking_times: list[dict] = _setting(parse_booking_times(DEFAULT_BOOKING_TIMES), parse=parse_booking_times)
+    booking_days: str = _setting("release", parse=str.lower)
+    booking_limit_per_day: int = _setting(0, parse=int)
+    booking_limit_total: int = _setting(0, parse=int)
+
+    resource_url_path: str = _setting()
+    service_id: str = _setting()
+    resource_groups: list[tuple[str, str]] = _setting([], parse=parse_resource_groups)
+    use_all_resource_groups: bool = _setting(False, parse=_bool)
+    resource_ids: list[str] = _setting([], parse=parse_csv)
+    use_any_resource_id: bool = _setting(False, parse=_bool)
+    preferred_areas: list[str] = _setting([], parse=parse_csv)
+    preferred_names: list[str] = _setting([], parse=parse_csv)
+    preferred_features: list[str] = _setting([], parse=parse_csv)
+
+    include_profile: str = _setting("lean", parse=str.lower)
+    availability_workers: int = _setting(8, parse=int)
+    retry_budget_seconds: float = _setting(10.0, parse=float)
+    retry_base_delay_ms: float = _setting(100.0, parse=float)
+    retry_max_delay_ms: float = _setting(2000.0, parse=float)
+    # "sequential" tries one resource at a time, "race" creates orders for up to race_fan_out resources at once
+    reserve_strategy: str = _setting("sequential", parse=str.lower)
+    race_fan_out: int = _setting(3, parse=int)
+
+    # Only override these to point the script at a stand-in (see benchmarks/mock_server.py)
+    auth_base_url: str = _setting("https://auth.anny.eu", env="ANNY_AUTH_BASE_URL")
+    anny_base_url: str = _setting("https://anny.eu", env="ANNY_BASE_URL")
+    booking_api_base: str = _setting("https://b.anny.eu/api/v1", env="ANNY_BOOKING_API_BASE")
+    checkout_form_api: str = _setting("https://b.anny.eu/api/ui/checkout-form", env="ANNY_CHECKOUT_FORM_API")
+    kit_idp_url: str = _setting("https://idp.scc.kit.edu/idp/profile/SAML2/Redirect/SSO?execution=e1s1")
+
+    def __post_init__(self):
+        for slot in self.booking_times:
+            if not slot["start"] < slot["end"]:
+                raise ConfigError(f"BOOKING_TIMES: slot {slot['start']}-{slot['end']} ends before it starts")
+        if self.booking_days not in ("release", "all"):
+            try:
+                parse_weekdays(self.booking_days)
+            except ValueError as e:
+                raise ConfigError(f"BOOKING_DAYS: {e}") from None
+        if self.include_profile not in ("lean", "full"):
+            raise ConfigError(f"INCLUDE_PROFILE must be lean or full, got {self.include_profile!r}")
+        if self.availability_workers < 1:
+            raise ConfigError("AVAILABILITY_WORKERS must be at least 1")
+        if min(self.booking_limit_per_day, self.booking_limit_total) < 0:
+            raise ConfigError("Booking limits must not be negative")
+        if self.reserve_strategy not in ("sequential", "race"):
+            raise ConfigError(f"RESERVE_STRATEGY must be sequential or race, got {self.reserve_strategy!r}")
+        if not 1 <= self.race_fan_out <= 10:
+            raise ConfigError("RACE_FAN_OUT must be between 1 and 10")
+
+        import pytz
+        try:
+            pytz.timezone(self.timezone)
+        except pytz.UnknownTimeZoneError:
+            raise ConfigError(f"TIMEZONE: unknown time zone {self.timezone!r}") from None
+
+    @property
+    def resource_url(self) -> str | None:
+        return f"{self.booking_api_base}{self.resource_url_path}" if self.resource_url_path else None
+
+    @property
+    def tz(self):
+        import pytz
+        return pytz.timezone(self.timezone)
+
+
+@dataclass(frozen=True)
+class ProcessSettings(_EnvSettings):
+    """
+    Process-wide settings of the entry points: caches, clock calibration, batch, daemon
+    and watch mode, run history and tracing. The entry points read them next to the
+    Settings of their accounts and pass them on; the library modules read nothing.
+    """
+
+    # Session cache - reuses the anny login across runs while the JWT is still valid
+    use_session_cache: bool = _setting(True, parse=_bool)
+    session_cache_path: str = _setting(".anny_session.json")
+
+    # Midnight trigger - calibrate against the server clock and fire this many ms after the server's midnight
+    clock_calibration: bool = _setting(True, parse=_bool)
+    clock_samples: int = _setting(6, parse=int)
+    fire_margin_ms: float = _setting(30.0, parse=float)
+
+    # Batch mode (batch.py) - parallel logins while arming and parallel accounts while firing
+    batch_login_workers: int = _setting(4, parse=int)
+    batch_fire_workers: int = _setting(16, parse=int)
+
+    # Resource index - caches discovered resources and desks on disk
+    use_resource_index: bool = _setting(True, parse=_bool)
+    resource_index_path: str = _setting(".anny_resources.json")
+    resource_index_ttl_hours: float = _setting(168.0, parse=float)
+
+    # Daemon mode (daemon.py) - control endpoint, arming lead time before the release,
+    # interval of the background session checks and how long before expiry sessions are renewed
+    daemon_control_port: int = _setting(8765, parse=int)
+    daemon_arm_lead_seconds: float = _setting(300.0, parse=float)
+    daemon_check_interval_seconds: float = _setting(300.0, parse=float)
+    daemon_refresh_margin_seconds: float = _setting(1800.0, parse=float)
+
+    # Watch mode (python -m booking.watcher) - days ahead to watch (default: all bookable days) and poll interval bounds
+    watch_days_ahead: list[int] = _setting([], parse=parse_int_csv)
+    watch_min_interval_seconds: float = _setting(20.0, parse=float)
+    watch_max_interval_seconds: float = _setting(300.0, parse=float)
+
+    # Run history - SQLite database with every run, availability query and reserve attempt (python -m booking.history)
+    use_run_history: bool = _setting(True, parse=_bool)
+    run_history_path: str = _setting(".anny_history.db")
+
+    # Desk claims - bookers sharing this SQLite file, or the claims server at the URL (with its token),
+    # partition the desks among themselves at a release
+    use_desk_claims: bool = _setting(False, parse=_bool)
+    desk_claims_path: str = _setting(".anny_claims.db")
+    desk_claims_url: str = _setting()
+    desk_claims_token: str = _setting()
+
+    # Tracing - run report file ("json" or "otlp" format) and optional OpenTelemetry collector endpoint
+    trace_report_path: str = _setting()
+    trace_report_format: str = _setting("json", parse=str.lower)
+    trace_otlp_endpoint: str = _setting()
+
+    def __post_init__(self):
+        if min(self.clock_samples, self.batch_login_workers, self.batch_fire_workers) < 1:
+            raise ConfigError("CLOCK_SAMPLES, BATCH_LOGIN_WORKERS and BATCH_FIRE_WORKERS must be at least 1")
+        if not 0 < self.watch_min_interval_seconds <= self.watch_max_interval_seconds:
+            raise ConfigError("WATCH_MIN_INTERVAL_SECONDS must be positive and at most WATCH_MAX_INTERVAL_SECONDS")
+        if self.trace_report_format not in ("json", "otlp"):
+            raise ConfigError(f"TRACE_REPORT_FORMAT must be json or otlp, got {self.trace_report_format!r}")
+
+    @property
+    def resource_index_ttl(self) -> float:
+        return self.resource_index_ttl_hours * 3600
+
+
+def load_settings(env_file: str = ".env") -> Settings | None:
+    """Settings of the entry points from the environment and `env_file`. Prints the error and returns None if invalid."""
+    try:
+        return Settings.from_env(env_file=env_file)
+    except ConfigError as e:
+        print(f"❌ Invalid configuration: {e}")
+        return None
+
+
+def load_process_settings(env_file: str = ".env") -> ProcessSettings | None:
+    """ProcessSettings from the environment and `env_file`. Prints the error and returns None if invalid."""
+    try:
+        return ProcessSettings.from_env(env_file=env_file)
+    except ConfigError as e:
+        print(f"❌ Invalid configuration: {e}")
+        return None
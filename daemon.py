@@ -0,0 +1,286 @@
+"""
+Resident booking daemon: stays logged in, renews sessions before they expire and
+books at every release time of the configured accounts, without cold starts.
+
+    python daemon.py [--roster roster.json]   start the daemon (accounts from .env or a roster)
+    python daemon.py status                    print the status of a running daemon
+    python daemon.py run                       book now with all accounts
+    python daemon.py refresh                   log all accounts in again
+"""
+import argparse
+import datetime
+import json
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from dotenv import load_dotenv
+
+from auth.cache import SessionCache
+from batch import load_roster, arm_all, fire_all
+from booking.claims import DeskClaims, open_store
+from booking.history import RunHistory
+from booking.resource_index import ResourceIndex
+from booking.runner import BookingRun, next_release_at, monotonic_deadline
+from utils.output import prefix_output, as_account
+from utils.tracing import tracer
+from config.settings import Settings, ProcessSettings, load_settings, load_process_settings
+
+
+class BookingDaemon:
+    """
+    Schedules booking runs at the release time of every account's SSO provider.
+
+    Between releases, every account's session is checked every DAEMON_CHECK_INTERVAL_SECONDS
+    and renewed in the background when the token is rejected or about to expire.
+    DAEMON_ARM_LEAD_SECONDS before a release, the accounts due are made ready and the
+    connections are kept warm until the release. Ad-hoc runs and refreshes requested
+    through the control endpoint are executed by the scheduler thread in between.
+    """
+
+    def __init__(self, runs: list[BookingRun], tz, process: ProcessSettings):
+        self.runs = runs
+        self.tz = tz
+        self.process = process
+        self.state = "starting"
+        self.next_release: datetime.datetime = None
+        self.last_run: dict = None
+        self._wake = threading.Event()
+        self._requests: list[str] = []
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def request(self, action: str):
+        """Queue "run" or "refresh" for the scheduler thread."""
+        with self._lock:
+            if action not in self._requests:
+                self._requests.append(action)
+        self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def release_of(self, run: BookingRun) -> datetime.datetime:
+        return next_release_at(self.tz, run.session.provider.release_time)
+
+    def serve(self):
+        arm_all(self.runs, self.process, arm=self.ensure_fresh)
+
+        while not self._stopping:
+            releases = {run: self.release_of(run) for run in self.runs}
+            self.next_release = min(releases.values())
+            due = [run for run, release in releases.items() if release == self.next_release]
+            print(f"📅 Next release at {self.next_release.isoformat()} for {len(due)} account(s)")
+
+            self.state = "idle"
+            arm_at = monotonic_deadline(self.next_release) - self.process.daemon_arm_lead_seconds
+            while not self._stopping and time.monotonic() < arm_at:
+                self._wake.wait(min(self.process.daemon_check_interval_seconds, max(arm_at - time.monotonic(), 0)))
+                self._wake.clear()
+                with self._lock:
+                    requested, self._requests = self._requests, []
+
+                if "refresh" in requested:
+                    self.state = "refreshing"
+                    arm_all(self.runs, self.process, arm=lambda run: self.ensure_fresh(run, force=True))
+                if "run" in requested:
+                    self.book(self.runs, datetime.datetime.now(self.tz), "manual")
+                if not requested and time.monotonic() < arm_at:
+                    self.check_sessions()
+                self.state = "idle"
+
+            if not self._stopping and not self.book(due, self.next_release, "schedule"):
+                # No account could be made ready: every further attempt is a full SSO login, so
+                # retry after a pause, and once the release has passed move on to the next one
+                remaining = (self.next_release - datetime.datetime.now(self.tz)).total_seconds()
+                if remaining > 0:
+                    pause = min(self.process.daemon_check_interval_seconds, remaining)
+                    print(f"⚠️ No account could be made ready, retrying in {pause:.0f} seconds...")
+                    self._wake.wait(pause)
+                    self._wake.clear()
+
+    def check_sessions(self):
+        """Renew sessions that were rejected or expire within DAEMON_REFRESH_MARGIN_SECONDS."""
+        for run in self.runs:
+            as_account(run.username, self.ensure_fresh, run)
+
+    def ensure_fresh(self, run: BookingRun, valid_until: float = None, force: bool = False) -> bool:
+        """
+        Make sure the run is armed with a session that is accepted and valid until
+        `valid_until` (unix time). `force` logs in again regardless.
+        """
+        try:
+            return self._ensure_fresh(run, valid_until, force)
+        except requests.RequestException as e:
+            print(f"⚠️ {run.username}: session check failed ({type(e).__name__})")
+            return False
+
+    def _ensure_fresh(self, run: BookingRun, valid_until: float, force: bool) -> bool:
+        if not run.ready:
+            return run.arm()
+        if force:
+            return run.refresh()
+
+        valid_until = valid_until or time.time() + self.process.daemon_refresh_margin_seconds
+        expires_at = run.token_expires_at()
+        if expires_at and expires_at < valid_until:
+            print(f"♻️ {run.username}: session expires in {(expires_at - time.time()) / 60:.0f} min, renewing...")
+            return run.refresh()
+
+        # Also keeps the connection to b.anny.eu open
+        if not run.booking.check_auth():
+            print(f"♻️ {run.username}: session was rejected, logging in again...")
+            return run.refresh()
+        return True
+
+    def book(self, runs: list[BookingRun], release: datetime.datetime, trigger: str) -> bool:
+        """
+        Make the runs ready, wait for `release` unless it has passed, and book for all of them.
+        Returns False if no run could be made ready.
+        """
+        self.state = "arming"
+        # The session must still be valid when the last booking of the run goes out
+        valid_until = release.timestamp() + self.process.daemon_refresh_margin_seconds
+        armed = arm_all(runs, self.process, arm=lambda run: self.ensure_fresh(run, valid_until))
+        if not armed:
+            self.last_run = {"trigger": trigger, "release": release.isoformat(), "results": {}}
+            return False
+
+        for run in armed:
+            run.booking.retry.reset()
+
+        deadline = monotonic_deadline(release)
+        self.state = "waiting" if deadline > time.monotonic() else "firing"
+        started_at = datetime.datetime.now(self.tz)
+        results = fire_all(armed, release, deadline if deadline > time.monotonic() else None,
+                           self.process, trigger)
+        tracer.reset()
+
+        self.last_run = {
+            "trigger": trigger,
+            "release": release.isoformat(),
+            "started_at": started_at.isoformat(),
+            "results": {run.username: result for run, result in zip(armed, results)},
+        }
+        return True
+
+    def status(self) -> dict:
+        accounts = []
+        for run in self.runs:
+            expires_at = run.token_expires_at()
+            accounts.append({
+                "username": run.username,
+                "provider": run.session.provider.name,
+                "ready": run.ready,
+                "session_expires_in": round(expires_at - time.time()) if expires_at else None,
+                "next_release": self.release_of(run).isoformat(),
+            })
+        return {
+            "state": self.state,
+            "next_release": self.next_release.isoformat() if self.next_release else None,
+            "accounts": accounts,
+            "last_run": self.last_run,
+        }
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """GET /status, POST /run and POST /refresh on the local control endpoint."""
+
+    booking_daemon: BookingDaemon = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body, indent=2).encode()
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/status":
+            return self._send(200, self.booking_daemon.status())
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        action = self.path.strip("/")
+        if action not in ("run", "refresh"):
+            return self._send(404, {"error": "not found"})
+        self.booking_daemon.request(action)
+        self._send(202, {"queued": action})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_runs(settings: Settings, process: ProcessSettings, roster_path: str = None) -> list[BookingRun]:
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    index = ResourceIndex(process.resource_index_path, process.resource_index_ttl) if process.use_resource_index else None
+    store = open_store(process)
+    history = RunHistory(process.run_history_path) if process.use_run_history else None
+    if roster_path:
+        return load_roster(roster_path, settings, cache, index, store, history)
+    if not settings.username or not settings.password:
+        print("❌ Missing USERNAME or PASSWORD in .env")
+        return []
+    claims = DeskClaims.for_account(store, settings) if store else None
+    return [BookingRun(settings, cache=cache, index=index, claims=claims, run_history=history)]
+
+
+def serve(process: ProcessSettings, roster_path: str = None):
+    settings = load_settings()
+    runs = build_runs(settings, process, roster_path) if settings else []
+    if not runs:
+        return False
+    # Accounts are armed and booked in parallel; start each line with the account it belongs to
+    prefix_output()
+
+    booking_daemon = BookingDaemon(runs, settings.tz, process)
+    ControlHandler.booking_daemon = booking_daemon
+    # Only reachable from this machine
+    control = ThreadingHTTPServer(("127.0.0.1", process.daemon_control_port), ControlHandler)
+    threading.Thread(target=control.serve_forever, daemon=True).start()
+    print(f"ℹ️ Control endpoint listening on http://127.0.0.1:{process.daemon_control_port}")
+
+    signal.signal(signal.SIGTERM, lambda *_: booking_daemon.stop())
+    signal.signal(signal.SIGINT, lambda *_: booking_daemon.stop())
+    try:
+        booking_daemon.serve()
+    finally:
+        control.shutdown()
+    print("👋 Daemon stopped")
+    return True
+
+
+def control(action: str, port: int) -> bool:
+    url = f"http://127.0.0.1:{port}/{action}"
+    try:
+        response = requests.get(url, timeout=5) if action == "status" else requests.post(url, timeout=5)
+    except requests.ConnectionError:
+        print(f"❌ No daemon is listening on port {port}")
+        return False
+    print(json.dumps(response.json(), indent=2))
+    return response.ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="serve", choices=("serve", "status", "run", "refresh"))
+    parser.add_argument("--roster", help="Book for the accounts in this roster file instead of the .env account")
+    args = parser.parse_args()
+
+    # Get variables from dotenv file, which may also hold the passwords of roster entries (password_env)
+    load_dotenv('.env', override=True)
+    process = load_process_settings()
+    if not process:
+        return False
+    if args.command == "serve":
+        return serve(process, args.roster)
+    return control(args.command, process.daemon_control_port)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,88 +1,54 @@
-import datetime
 import time
 
-from auth.session import AnnySession
-from booking.client import BookingClient, CheckoutException
-from utils.helpers import get_future_datetime
-import pytz
-from config.constants import USERNAME, PASSWORD, RESOURCE_IDS, USE_ANY_RESOURCE_ID, TIMEZONE, SSO_PROVIDER, BOOKING_TIMES
+from auth.cache import SessionCache
+from booking.claims import DeskClaims, open_store
+from booking.history import RunHistory
+from booking.resource_index import ResourceIndex
+from booking.runner import BookingRun, next_release, calibrate_deadline, report_fire_error, write_trace
+from utils.scheduler import wait_until
+from utils.tracing import tracer
+from config.settings import load_settings, load_process_settings
 
 def main():
-    tz = pytz.timezone(TIMEZONE)
+    settings, process = load_settings(), load_process_settings()
+    if not settings or not process:
+        return False
+    tz = settings.tz
 
-    if not USERNAME or not PASSWORD:
+    if not settings.username or not settings.password:
         print("❌ Missing USERNAME or PASSWORD in .env")
         return False
 
-    if not BOOKING_TIMES:
+    if not settings.booking_times:
         print("❌ Missing timeslots in BOOKING_TIMES")
         return False
 
-    session = AnnySession(USERNAME, PASSWORD, provider_name=SSO_PROVIDER)
-    cookies = session.login()
-
-    if not cookies:
+    cache = SessionCache(process.session_cache_path) if process.use_session_cache else None
+    index = ResourceIndex(process.resource_index_path, process.resource_index_ttl) if process.use_resource_index else None
+    store = open_store(process)
+    claims = DeskClaims.for_account(store, settings) if store else None
+    history = RunHistory(process.run_history_path) if process.use_run_history else None
+    run = BookingRun(settings, cache=cache, index=index, claims=claims, run_history=history)
+    if not run.arm():
         return False
 
-    booking = BookingClient(cookies, customer_account_id=session.customer_account_id)
-
-    if not booking.resource_url or not booking.service_id:
-        print("ℹ️ RESOURCE_URL_PATH or SERVICE_ID not set — attempting auto-discovery...")
-        if not booking.discover_resource_config():
-            print("❌ Auto-discovery failed. Please set RESOURCE_URL_PATH and SERVICE_ID in your .env")
-            return False
-
-    # Only wait for midnight if within 10 minutes, otherwise execute immediately
-    now = datetime.datetime.now(tz)
-    midnight = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
-    seconds_until_midnight = (midnight - now).total_seconds()
-    max_wait_seconds = 10 * 60  # 10 minutes
-
-    if 0 < seconds_until_midnight <= max_wait_seconds:
-        print(f"⏳ Waiting {seconds_until_midnight:.0f} seconds until midnight...")
-        time.sleep(seconds_until_midnight)
-    elif seconds_until_midnight > max_wait_seconds:
-        print(f"⚡ More than 10 min until midnight, executing immediately...")
-
-    for time_ in BOOKING_TIMES:
-        try:
-            days_ahead = session.provider.available_days_ahead
-            start = get_future_datetime(days_ahead=days_ahead, time_string=time_['start'])
-            end = get_future_datetime(days_ahead=days_ahead, time_string=time_['end'])
-
-            r_ids_available = booking.find_available_resources(start, end)
-
-            if r_ids_available is None:
-                print(f"⚠️ Could not fetch available resources for {time_['start']}-{time_['end']}, skipping...")
-                continue
-
-            r_ids_book = []
-            for r_id_av in (RESOURCE_IDS or []):
-                if r_id_av in r_ids_available:
-                    r_ids_book.append(r_id_av)
-                    r_ids_available.remove(r_id_av)
+    release, deadline = next_release(tz)
+    run.plan(release)
 
-            if USE_ANY_RESOURCE_ID:
-                r_ids_book += r_ids_available
+    if deadline:
+        deadline = calibrate_deadline(run.booking, deadline, process)
+        print(f"⏳ Armed, waiting {deadline - time.monotonic():.0f} seconds until midnight...")
+        with tracer.span("wait"):
+            wait_until(deadline, keep_alive=run.booking.keep_alive)
 
-            # Iterate through resource ids until booking is successful
-            for i, r_id in enumerate(r_ids_book):
-                try:
-                    success = booking.reserve(r_id, start, end)
-                except CheckoutException:
-                    # Reservation failed on checkout -> Booking limit exceeded for that timeslot -> try next booking time
-                    print(f"⚠️ You have probably exceeded your booking limit for {time_['start']}-{time_['end']}")
-                    break
+    run.booking.adapter.reset_timing()
+    results = run.fire()
 
-                if success:
-                    break
+    if deadline:
+        report_fire_error(run.booking, deadline, process)
+    write_trace(process, release, "single")
 
-                print(f"  Attempt {i + 1}/{len(r_ids_book)}")
-            else:
-                print(f"⚠️ No available slots found for {time_['start']}-{time_['end']}")
-        except Exception as e:
-            print(f"❌ Error booking slot {time_['start']}-{time_['end']}: {e}")
-            break
+    return any(results.values())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+@dataclass
+class ClockEstimate:
+    """
+    offset: server clock minus local clock, in seconds
+    rtt: lowest observed round trip time, in seconds
+    uncertainty: half-width of the interval the true offset lies in, in seconds
+    """
+    offset: float = 0.0
+    rtt: float = 0.0
+    uncertainty: float = 0.5
+    samples: int = 0
+
+    def fire_delay(self, margin: float) -> float:
+        """
+        Seconds to add to a local deadline so a request sent then reaches the
+        server `margin` seconds after the same instant on the server's clock.
+        """
+        return -self.offset - self.rtt / 2 + margin
+
+
+class ClockCalibrator:
+    """
+    Estimates the offset between the local clock and a server clock from the
+    HTTP `Date` header.
+
+    `Date` only has one second resolution, so each sample only tells us that the
+    offset lies in an interval: the server's second S was read at some local
+    instant between sending (t0) and receiving (t1), hence S - t1 <= offset < S + 1 - t0.
+    Samples are spread over different fractions of a second and their intervals
+    are intersected, which narrows the estimate down to roughly the RTT.
+    """
+
+    def __init__(self, session: requests.Session, url: str, samples: int = 6):
+        self.session = session
+        self.url = url
+        self.samples = samples
+
+    def _sample(self) -> tuple[float, float, float] | None:
+        t0 = time.time()
+        response = self.session.head(self.url, timeout=5)
+        t1 = time.time()
+
+        date = response.headers.get('date')
+        if not date:
+            return None
+        try:
+            server = parsedate_to_datetime(date).timestamp()
+        except (TypeError, ValueError):
+            return None
+        return t0, t1, server
+
+    def calibrate(self) -> ClockEstimate:
+        samples = []
+        for i in range(self.samples):
+            try:
+                sample = self._sample()
+            except requests.RequestException:
+                sample = None
+            if sample:
+                samples.append(sample)
+            # Shift the next sample to a different fraction of the server's second
+            time.sleep(1.0 / self.samples)
+
+        if not samples:
+            return ClockEstimate()
+
+        rtt = min(t1 - t0 for t0, t1, _ in samples)
+        lower = max(server - t1 for t0, t1, server in samples)
+        upper = min(server + 1 - t0 for t0, t1, server in samples)
+
+        if lower > upper:
+            # Inconsistent samples (e.g. a delayed response) - fall back to the
+            # midpoint of the fastest sample, as NTP does.
+            t0, t1, server = min(samples, key=lambda s: s[1] - s[0])
+            return ClockEstimate(
+                offset=server + 0.5 - (t0 + t1) / 2,
+                rtt=rtt,
+                uncertainty=0.5 + rtt / 2,
+                samples=len(samples)
+            )
+
+        return ClockEstimate(
+            offset=(lower + upper) / 2,
+            rtt=rtt,
+            uncertainty=(upper - lower) / 2,
+            samples=len(samples)
+        )
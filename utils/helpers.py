@@ -1,13 +1,13 @@
 import re
 import html
 import datetime
-import pytz
-from config.constants import TIMEZONE
 
-def get_future_datetime(days_ahead=3, time_string="13:00:00"):
-    tz = pytz.timezone(TIMEZONE)
+def get_future_datetime(days_ahead=3, time_string="13:00:00", base=None, timezone="Europe/Berlin"):
+    """`base` is the instant the offset is counted from (default: now), e.g. the upcoming midnight."""
+    import pytz
+    tz = pytz.timezone(timezone)
     h, m, s = [int(h) for h in time_string.split(":")]
-    dt = datetime.datetime.now(tz=tz) + datetime.timedelta(days=days_ahead)
+    dt = (base or datetime.datetime.now(tz=tz)).astimezone(tz) + datetime.timedelta(days=days_ahead)
     dt_correct_time = tz.localize(datetime.datetime(dt.year, dt.month, dt.day, h, m, s))
     return dt_correct_time.isoformat()
 
@@ -16,3 +16,70 @@ def extract_html_value(text, pattern):
     if not match:
         raise ValueError(f"Pattern not found: {pattern}")
     return html.unescape(match.group(1))
+
+def parse_csv(value):
+    """Split a comma separated string (or pass through a list) into stripped, non-empty items."""
+    if not value:
+        return []
+    items = value.split(",") if isinstance(value, str) else value
+    return [str(i).strip() for i in items if str(i).strip()]
+
+def parse_int_csv(value):
+    """Like parse_csv, with every item converted to an int. Raises ValueError on other items."""
+    return [int(i) for i in parse_csv(value)]
+
+def parse_time(value):
+    """Normalize "hh:mm" or "hh:mm:ss" to "hh:mm:ss". Raises ValueError if it is no valid time."""
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt).strftime("%H:%M:%S")
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid time: {value}")
+
+def parse_booking_times(value):
+    """
+    Parse "hh:mm:ss-hh:mm:ss" slots (comma separated string or list) into start/end dicts.
+    Raises ValueError on malformed slots.
+    """
+    if not isinstance(value, str) and value and isinstance(value[0], dict):
+        return [{"start": parse_time(b["start"]), "end": parse_time(b["end"])} for b in value]
+
+    slots = []
+    for b in parse_csv(value):
+        start, sep, end = b.partition("-")
+        if not sep:
+            raise ValueError(f"Invalid booking time (expected hh:mm:ss-hh:mm:ss): {b}")
+        slots.append({"start": parse_time(start), "end": parse_time(end)})
+    return slots
+
+def parse_resource_groups(value):
+    """
+    Parse "resource path:service id" pairs (comma separated string, or a list of such
+    strings or [path, service id] pairs) into tuples. Raises ValueError on malformed pairs.
+    """
+    groups = []
+    for item in (parse_csv(value) if isinstance(value, str) else value or []):
+        if isinstance(item, str):
+            path, _, service_id = item.rpartition(":")
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            path, service_id = item
+        else:
+            path = service_id = None
+        if not isinstance(path, str) or not path.strip().startswith("/") or not str(service_id or "").strip():
+            raise ValueError(f"Invalid resource group (expected /resources/...:service id): {item}")
+        groups.append((path.strip(), str(service_id).strip()))
+    return groups
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+def parse_weekdays(value):
+    """Parse a weekday pattern like "mon-fri" or "mon,wed,sat-sun" into weekday numbers (Monday = 0)."""
+    days = set()
+    for part in parse_csv(value.lower()):
+        first, _, last = part.partition("-")
+        if first[:3] not in WEEKDAYS or (last and last[:3] not in WEEKDAYS):
+            raise ValueError(f"Invalid weekday pattern: {value}")
+        start, end = WEEKDAYS.index(first[:3]), WEEKDAYS.index((last or first)[:3])
+        days.update(range(start, end + 1) if start <= end else [*range(start, 7), *range(0, end + 1)])
+    return days
@@ -0,0 +1,47 @@
+import time
+from requests.adapters import HTTPAdapter
+
+from utils.tracing import tracer
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records the monotonic time requests are handed to the connection
+    pool, and traces every request with its status code and body sizes. Requests sent
+    without a timeout get `timeout` (seconds), so none can hang forever.
+    """
+
+    def __init__(self, *args, timeout: float = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+        self.first_sent_at: float = None
+        self.last_sent_at: float = None
+
+    def reset_timing(self):
+        self.first_sent_at = None
+        self.last_sent_at = None
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        now = time.monotonic()
+        if self.first_sent_at is None:
+            self.first_sent_at = now
+        self.last_sent_at = now
+
+        request_bytes = len(request.body or b"")
+        try:
+            response = super().send(request, **kwargs)
+        except Exception as e:
+            tracer.record_http(request.method, request.url, now, time.monotonic(),
+                               request_bytes=request_bytes, error=type(e).__name__)
+            raise
+
+        # requests reads the body right after send() anyway unless the caller streams it
+        if kwargs.get("stream"):
+            response_bytes = int(response.headers.get('content-length') or 0)
+        else:
+            response_bytes = len(response.content)
+        tracer.record_http(request.method, request.url, now, time.monotonic(), response.status_code,
+                           request_bytes, response_bytes)
+        return response
@@ -0,0 +1,52 @@
+"""
+Account prefixes for the output of runs that execute side by side (batch.py, daemon.py),
+so every line of an interleaved log can be told apart.
+"""
+import contextvars
+import sys
+import threading
+
+# Prefix of the lines written in the current context; copied into the worker threads with the context
+line_prefix = contextvars.ContextVar("line_prefix", default="")
+
+
+class PrefixedOutput:
+    """Text stream that writes whole lines only, each starting with the writer's `line_prefix`."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        *lines, self.local.pending = (getattr(self.local, "pending", "") + text).split("\n")
+        if lines:
+            prefix = line_prefix.get()
+            with self.lock:
+                self.stream.write("".join(f"{prefix}{line}\n" for line in lines))
+        return len(text)
+
+    def flush(self):
+        pending, self.local.pending = getattr(self.local, "pending", ""), ""
+        with self.lock:
+            if pending:
+                self.stream.write(line_prefix.get() + pending)
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def prefix_output():
+    """Replace sys.stdout with a PrefixedOutput (once)."""
+    if not isinstance(sys.stdout, PrefixedOutput):
+        sys.stdout = PrefixedOutput(sys.stdout)
+
+
+def as_account(username: str, function, *args):
+    """Call `function(*args)` with every line it prints prefixed with the username."""
+    token = line_prefix.set(f"[{username}] ")
+    try:
+        return function(*args)
+    finally:
+        line_prefix.reset(token)
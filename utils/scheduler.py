@@ -0,0 +1,43 @@
+import time
+
+# Below this many seconds before the deadline we stop sleeping and spin instead,
+# because time.sleep() may overshoot by a scheduler tick.
+SPIN_THRESHOLD = 0.02
+
+
+def wait_until(deadline: float, keep_alive=None, keep_alive_interval: float = 15.0) -> float:
+    """
+    Block until the monotonic clock reaches `deadline`.
+
+    While waiting, `keep_alive` (if given) is called right away and then every
+    `keep_alive_interval` seconds to keep pooled connections from going idle.
+    Returns how late we woke up, in seconds.
+    """
+    next_keep_alive = time.monotonic()
+
+    while True:
+        now = time.monotonic()
+        remaining = deadline - now
+        if remaining <= SPIN_THRESHOLD:
+            break
+
+        # Never start a keep-alive request that could still be running at the deadline
+        can_keep_alive = keep_alive and remaining > keep_alive_interval / 2
+
+        if can_keep_alive and now >= next_keep_alive:
+            try:
+                keep_alive()
+            except Exception as e:
+                print(f"⚠️ Keep-alive request failed: {e}")
+            next_keep_alive = time.monotonic() + keep_alive_interval
+            continue
+
+        sleep_for = remaining - SPIN_THRESHOLD
+        if can_keep_alive:
+            sleep_for = min(sleep_for, next_keep_alive - now)
+        time.sleep(max(sleep_for, 0))
+
+    while time.monotonic() < deadline:
+        pass
+
+    return time.monotonic() - deadline
@@ -0,0 +1,293 @@
+import contextvars
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import requests
+
+# Span that new spans are attached to. Context variables follow asyncio tasks;
+# code that hands work to threads passes the context on with contextvars.copy_context().
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+HTTP_SPAN = "http"
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: str | None
+    start: float                 # time.monotonic()
+    end: float = None
+    status: str = "ok"           # "ok" or "error"
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, reason: str = None):
+        self.status = "error"
+        if reason:
+            self.attributes["error"] = reason
+
+
+class Tracer:
+    """
+    Collects spans for the phases of a run (login, discovery, availability, order,
+    checkout, finalize) and for every HTTP request made inside them.
+
+    Timestamps are monotonic; they are converted to Unix time only for OpenTelemetry
+    export. Spans are kept in memory until `reset()`.
+    """
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._wall_offset = time.time() - time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self.trace_id = secrets.token_hex(16)
+            self.spans = []
+
+    @staticmethod
+    def current() -> Span | None:
+        return _current_span.get()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the enclosed block as a child of the current span. Exceptions mark the span as failed."""
+        parent = _current_span.get()
+        span = Span(name, secrets.token_hex(8), parent.span_id if parent else None, time.monotonic(),
+                    attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(type(e).__name__)
+            raise
+        finally:
+            span.end = time.monotonic()
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def record(self, name: str, start: float, end: float, status: str = "ok", **attributes) -> Span:
+        """Add a span that was timed elsewhere as a child of the current span."""
+        parent = _current_span.get()
+        span = Span(name, secrets.token_hex(8), parent.span_id if parent else None, start, end, status, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def record_http(self, method: str, url: str, start: float, end: float, status_code: int = None,
+                    request_bytes: int = 0, response_bytes: int = 0, error: str = None) -> Span:
+        # Only the path is kept - query strings carry order access tokens
+        parts = urlsplit(url)
+        attributes = {
+            "http.request.method": method,
+            "server.address": parts.hostname,
+            "url.path": parts.path,
+            "http.request.body.size": request_bytes,
+            "http.response.body.size": response_bytes,
+        }
+        if status_code is not None:
+            attributes["http.response.status_code"] = status_code
+        if error:
+            attributes["error"] = error
+        failed = error is not None or (status_code or 0) >= 400
+        return self.record(HTTP_SPAN, start, end, "error" if failed else "ok", **attributes)
+
+    def wall_time(self, t: float) -> float:
+        """Unix time of the monotonic timestamp `t`."""
+        return t + self._wall_offset
+
+    # --- analysis -----------------------------------------------------------
+
+    def _snapshot(self) -> list[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start)
+
+    @staticmethod
+    def _children(spans):
+        children = {}
+        for span in spans:
+            children.setdefault(span.parent_id, []).append(span)
+        return children
+
+    def _descendants(self, root, children):
+        stack, found = list(children.get(root.span_id, [])), []
+        while stack:
+            span = stack.pop()
+            found.append(span)
+            stack += children.get(span.span_id, [])
+        return found
+
+    def fires(self) -> list[tuple[Span, list[Span]]]:
+        """Every "fire" span (one per account and run) with the spans nested under it."""
+        spans = self._snapshot()
+        children = self._children(spans)
+        return [(s, sorted(self._descendants(s, children), key=lambda d: d.start)) for s in spans if s.name == "fire"]
+
+    def critical_path(self, root: Span, target: Span, spans: list[Span] = None) -> list[dict]:
+        """
+        Walk backwards from the end of `target` to the start of `root` and return the
+        chain of leaf spans (mostly HTTP requests) that each step had to wait for.
+        Time not covered by any span shows up as `wait_ms` before the next step.
+        """
+        spans = spans or self._snapshot()
+        children = self._children(spans)
+        by_id = {s.span_id: s for s in spans}
+        leaves = [s for s in self._descendants(root, children)
+                  if s.span_id not in children and s.end is not None and s.end <= target.end]
+
+        path, t = [], target.end
+        while t > root.start:
+            blockers = [s for s in leaves if s.end <= t and s.start < t and s not in path]
+            if not blockers:
+                break
+            blocker = max(blockers, key=lambda s: s.end)
+            path.insert(0, blocker)
+            t = blocker.start
+
+        steps = []
+        previous_end = root.start
+        for span in path:
+            phase = span
+            while phase.name == HTTP_SPAN and phase.parent_id in by_id:
+                phase = by_id[phase.parent_id]
+            steps.append({
+                "phase": phase.name,
+                "span": self._label(span),
+                "start_ms": round((span.start - root.start) * 1000, 1),
+                "duration_ms": round(span.duration * 1000, 1),
+                "wait_ms": round(max(span.start - previous_end, 0) * 1000, 1),
+            })
+            previous_end = span.end
+        return steps
+
+    @staticmethod
+    def _label(span: Span) -> str:
+        if span.name != HTTP_SPAN:
+            return span.name
+        status = span.attributes.get("http.response.status_code") or span.attributes.get("error")
+        return f"{span.attributes.get('http.request.method')} {span.attributes.get('url.path')} -> {status}"
+
+    def summary(self) -> list[dict]:
+        """
+        One entry per "fire" span (one per account): time from the trigger to every
+        confirmed booking, and the critical path up to the first one.
+        """
+        spans = self._snapshot()
+        summaries = []
+        for fire, nested in self.fires():
+            confirmed = sorted((s for s in nested if s.name == "finalize" and s.status == "ok"), key=lambda s: s.end)
+            summaries.append({
+                "account": fire.attributes.get("account"),
+                "fire_ms": round(fire.duration * 1000, 1),
+                "bookings": [{
+                    "resource_id": s.attributes.get("resource_id"),
+                    "confirmed_after_ms": round((s.end - fire.start) * 1000, 1),
+                } for s in confirmed],
+                "critical_path": self.critical_path(fire, confirmed[0], spans) if confirmed else [],
+            })
+        return summaries
+
+    def print_summary(self):
+        for entry in self.summary():
+            account = f"{entry['account']}: " if entry["account"] else ""
+            if not entry["bookings"]:
+                print(f"⏱️ {account}No booking confirmed, fire phase took {entry['fire_ms']:.0f} ms")
+                continue
+
+            phases = []
+            for step in entry["critical_path"]:
+                if phases and phases[-1][0] == step["phase"]:
+                    phases[-1][1] += step["duration_ms"] + step["wait_ms"]
+                else:
+                    phases.append([step["phase"], step["duration_ms"] + step["wait_ms"]])
+            path = " → ".join(f"{name} {ms:.0f} ms" for name, ms in phases)
+            print(f"⏱️ {account}First booking confirmed {entry['bookings'][0]['confirmed_after_ms']:.0f} ms "
+                  f"after the trigger ({path})")
+
+    # --- export -------------------------------------------------------------
+
+    def report(self) -> dict:
+        """JSON run report: every span relative to the first one, plus the summary."""
+        spans = self._snapshot()
+        origin = spans[0].start if spans else 0
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.wall_time(origin) if spans else None,
+            "spans": [{
+                "name": s.name,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "start_ms": round((s.start - origin) * 1000, 3),
+                "duration_ms": round(s.duration * 1000, 3),
+                "status": s.status,
+                "attributes": s.attributes,
+            } for s in spans],
+            "summary": self.summary(),
+        }
+
+    def otlp(self) -> dict:
+        """The spans as an OTLP/JSON ExportTraceServiceRequest, as accepted by OpenTelemetry collectors."""
+        def value(v):
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        def nanos(t):
+            return str(int(self.wall_time(t) * 1e9))
+
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "anny-booking-automation"}}]},
+            "scopeSpans": [{
+                "scope": {"name": "anny-booking-automation"},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": s.span_id,
+                    **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                    "name": f"HTTP {s.attributes.get('http.request.method')}" if s.name == HTTP_SPAN else s.name,
+                    "kind": 3 if s.name == HTTP_SPAN else 1,  # CLIENT / INTERNAL
+                    "startTimeUnixNano": nanos(s.start),
+                    "endTimeUnixNano": nanos(s.end if s.end is not None else s.start),
+                    "attributes": [{"key": k, "value": value(v)} for k, v in s.attributes.items() if v is not None],
+                    "status": {"code": 2 if s.status == "error" else 1},
+                } for s in self._snapshot()],
+            }],
+        }]}
+
+    def save(self, path: str, format: str = "json"):
+        """Write the run report ("json") or the OTLP/JSON export ("otlp") to `path`."""
+        with open(path, "w") as f:
+            json.dump(self.otlp() if format == "otlp" else self.report(), f, indent=2)
+
+    def export_otlp(self, endpoint: str) -> bool:
+        """POST the spans to an OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces."""
+        try:
+            response = requests.post(endpoint, json=self.otlp(), timeout=5)
+        except requests.RequestException as e:
+            print(f"⚠️ Could not export trace: {e}")
+            return False
+        if not response.ok:
+            print(f"⚠️ Could not export trace: HTTP {response.status_code}")
+        return response.ok
+
+
+# Shared by all clients of a process
+tracer = Tracer()